@@ -0,0 +1,106 @@
+import numpy as np
+from enigma.Settings import Settings
+from enigma.Plugboard import Plugboard
+
+
+def compile_batch(settings_batch):
+    """
+    Resolves a list of settings dictionaries into the NumPy arrays used by run_batch.
+    All candidates must have the same number of rotors. Returns a dictionary with:
+     - 'forward', 'backward': (candidates, rotors, 26) ring-adjusted wheel maps
+     - 'reflector', 'plugboard': (candidates, 26) permutations
+     - 'positions', 'notches': (candidates, rotors) start positions and notches (-1 for wheels without a notch)
+    """
+    names, rings, positions, notches, reflectors, plugboards = [], [], [], [], [], []
+    for inputsettings in settings_batch:
+        newsettings = Settings(inputsettings)
+        rotors = newsettings.get_rotors()
+        names.append([rotor['wiring'] for rotor in rotors])
+        rings.append([ord(rotor['ring']) - ord('A') for rotor in rotors])
+        positions.append([ord(rotor['position']) - ord('A') for rotor in rotors])
+        notches.append([ord(rotor['notch']) - ord('A') if rotor['notch'] else -1 for rotor in rotors])
+        reflectors.append([ord(c) - ord('A') for c in newsettings.get_reflector()['wiring']])
+        plugboards.append(Plugboard(newsettings.get_plugboard_mapping()).table) #validated as in Enigma
+    if len({len(row) for row in names}) > 1:
+        raise ValueError("All settings in a batch must use the same number of rotors")
+    wirings = [[[ord(c) - ord('A') for c in wiring] for wiring in row] for row in names]
+    return compile_arrays(wirings, rings, positions, notches, reflectors, plugboards)
+
+
+def compile_arrays(wirings, rings, positions, notches, reflectors, plugboards):
+    """
+    The NumPy part of compile_batch, for callers that already hold letter indices rather than settings dictionaries.
+    Every argument has the candidates along its first axis: wirings (candidates, rotors, 26), rings, positions and notches
+     (candidates, rotors) counted from 0, reflectors and plugboards (candidates, 26).
+    """
+    #Wheel maps, then fold in the ring offset: map[i] -> (map[(i - ring) % 26] + ring) % 26
+    wirings = np.asarray(wirings, dtype=np.int64)
+    inverse = np.argsort(wirings, axis=-1)
+    ring = np.asarray(rings, dtype=np.int64)[..., None]
+    letters = np.arange(26)
+    shifted = (letters - ring) % 26
+    forward = (np.take_along_axis(wirings, shifted, axis=-1) + ring) % 26
+    backward = (np.take_along_axis(inverse, shifted, axis=-1) + ring) % 26
+
+    return {'forward': forward,
+            'backward': backward,
+            'reflector': np.asarray(reflectors, dtype=np.int64),
+            'plugboard': np.asarray(plugboards, dtype=np.int64),
+            'positions': np.asarray(positions, dtype=np.int64),
+            'notches': np.asarray(notches, dtype=np.int64)}
+
+
+def run_batch(machines, ciphertext):
+    """
+    Encodes the ciphertext under every compiled machine in lockstep.
+    Positions are stepped for all candidates at once, exactly like Enigma.step_rotors, and each letter
+     goes through the plugboard, the wheels, the reflector and back with one array lookup per stage.
+    Returns a (candidates, len(ciphertext)) uint8 array of ASCII letters.
+    """
+    forward = machines['forward']
+    backward = machines['backward']
+    reflector = machines['reflector']
+    plugboard = machines['plugboard']
+    notches = machines['notches']
+    positions = machines['positions'].copy()
+    ncandidates, nrotors = positions.shape
+    rows = np.arange(ncandidates)
+    output = np.empty((ncandidates, len(ciphertext)), dtype=np.uint8)
+
+    for i, inputchar in enumerate(ciphertext):
+        ##Step the rotors: the rightmost always, any wheel whose right neighbour is at its notch as well
+        stepping = np.zeros((ncandidates, nrotors), dtype=np.int64)
+        stepping[:, -1] = 1
+        for j in range(nrotors - 2, 0, -1):
+            stepping[:, j] = positions[:, j + 1] == notches[:, j + 1]
+        positions = (positions + stepping) % 26
+
+        ##Plugboard, forward through the rotors, reflector, backward and plugboard again
+        encoded = plugboard[:, ord(inputchar) - ord('A')]
+        for j in range(nrotors - 1, -1, -1):
+            encoded = (forward[rows, j, (encoded + positions[:, j]) % 26] - positions[:, j]) % 26
+        encoded = reflector[rows, encoded]
+        for j in range(nrotors):
+            encoded = (backward[rows, j, (encoded + positions[:, j]) % 26] - positions[:, j]) % 26
+        output[:, i] = plugboard[rows, encoded] + ord('A')
+    return output
+
+
+def encode_many(settings_batch, ciphertext):
+    """
+    Encodes/ decodes the same ciphertext under a whole batch of settings dictionaries at once.
+    Row k of the returned uint8 array holds the letters produced by settings_batch[k];
+     row.tobytes().decode() gives the same string as Enigma(settings_batch[k]).enigma_encode(ciphertext).
+    """
+    return run_batch(compile_batch(settings_batch), ciphertext)
+
+
+def rows_with_crib(letters, crib):
+    """
+    Boolean vector over the rows of an encode_many result, True where the crib appears anywhere in the row.
+    """
+    crib = np.frombuffer(crib.encode('ascii'), dtype=np.uint8)
+    found = np.zeros(letters.shape[0], dtype=bool)
+    for offset in range(letters.shape[1] - len(crib) + 1):
+        found |= np.all(letters[:, offset:offset + len(crib)] == crib, axis=1)
+    return found
@@ -0,0 +1,220 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from enigma.Enigma import Enigma, stepping_sequence, stepping_period
+from enigma.Rotor import conjugate_tables, position_rows
+from enigma.Bombe import Bombe, reflector_table
+from enigma.Examples import EXAMPLES
+
+#Machine used for the encoding and _check benchmarks
+BENCHMARK_SETTINGS = {'Reflector': 'B', 'Rotors': 'Beta I III', 'Rings': '23 02 10', 'Positions': 'I M G',
+                      'Plugboard': 'VH PT ZG BJ EY FS'}
+
+#Synthetic message lengths timed by default; pass e.g. --sizes 10000000 for the long runs
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+#Worked codes solved end to end by default; code 3 searches every wheel order and ring, see --codes and --batchsize
+DEFAULT_CODES = ['Code 1', 'Code 2', 'Code 4', 'Code 5']
+
+
+def clear_caches():
+    """
+    Empties every process-wide cache the encoder and the Bombe fill as they run, so the next run starts cold.
+    """
+    for cache in (stepping_sequence, stepping_period, conjugate_tables, position_rows, reflector_table):
+        cache.cache_clear()
+    Enigma.statetablecache.clear()
+
+
+def best_of(repeat, function, setup=None):
+    """
+    Runs function repeat times and returns (shortest wall time in seconds, result of the last run).
+    With setup, each run is function(setup()) and only the function call is timed, e.g. to start every run cold.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            argument = setup()
+            start = time.perf_counter()
+            result = function(argument)
+        else:
+            start = time.perf_counter()
+            result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def synthetic_message(length, seed=0):
+    """
+    A reproducible random message of A-Z letters.
+    """
+    generator = random.Random(seed)
+    return ''.join(generator.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(length))
+
+
+def bench_encode(sizes, repeat, statetables=None):
+    """
+    Encoding throughput of Enigma.enigma_encode on synthetic messages of each size, in letters per second.
+    Every size is timed twice: 'cold' builds a new machine on empty caches for each run, 'warm' encodes the same
+     message again on a machine that has just encoded it.
+    """
+    results = []
+
+    def fresh():
+        clear_caches()
+        return Enigma(BENCHMARK_SETTINGS, statetables=statetables)
+    for size in sizes:
+        message = synthetic_message(size)
+        seconds, _ = best_of(repeat, lambda machine: machine.enigma_encode(message), fresh)
+        results.append({'letters': size, 'statetables': statetables, 'cache': 'cold', 'seconds': seconds,
+                        'letters_per_second': size / seconds})
+        machine = fresh()
+        machine.enigma_encode(message)
+        seconds, _ = best_of(repeat, lambda: machine.enigma_encode(message))
+        results.append({'letters': size, 'statetables': statetables, 'cache': 'warm', 'seconds': seconds,
+                        'letters_per_second': size / seconds})
+    return results
+
+
+def bench_check(calls, repeat):
+    """
+    Bombe._check calls per second on the second worked code, cycling through its machine's start positions.
+    Timed 'cold', with a new Bombe and machine on empty caches for each run, and 'warm', running the same calls again.
+    """
+    name, code, crib, knownsettings, permittedsettings = EXAMPLES[1]
+    starts = [[p // 676, p // 26 % 26, p % 26] for p in range(0, 17576, 17576 // calls + 1)][:calls]
+
+    def fresh():
+        clear_caches()
+        return Bombe(code, crib, knownsettings, permittedsettings), Enigma(dict(BENCHMARK_SETTINGS))
+
+    def run(setup):
+        bombe, machine = setup
+        plugmap = list(machine.plugmap)
+        for positions in starts:
+            machine.positions = positions
+            bombe._check(machine, plugmap)
+    results = []
+    seconds, _ = best_of(repeat, run, fresh)
+    results.append({'scenario': name, 'cache': 'cold', 'calls': len(starts), 'seconds': seconds,
+                    'calls_per_second': len(starts) / seconds})
+    setup = fresh()
+    run(setup)
+    seconds, _ = best_of(repeat, lambda: run(setup))
+    results.append({'scenario': name, 'cache': 'warm', 'calls': len(starts), 'seconds': seconds,
+                    'calls_per_second': len(starts) / seconds})
+    return results
+
+
+def bench_solve(codes, repeat, batchsize=None):
+    """
+    End-to-end Bombe.solve time for each named worked code, and whether it found the crib.
+    """
+    results = []
+    for name, code, crib, knownsettings, permittedsettings in EXAMPLES:
+        if name not in codes:
+            continue
+
+        def run(_):
+            with contextlib.redirect_stdout(io.StringIO()): #solve prints the settings it finds
+                return Bombe(code, crib, knownsettings, permittedsettings, batchsize=batchsize).solve()
+        seconds, plaintext = best_of(repeat, run, clear_caches) #every run starts cold
+        results.append({'scenario': name, 'batchsize': batchsize, 'seconds': seconds,
+                        'solved': plaintext is not None and crib in plaintext})
+    return results
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, codes=DEFAULT_CODES, repeat=3, checkcalls=2000, batchsize=None):
+    """
+    Runs the whole suite and returns the results as a JSON-ready dictionary.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit,
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'encode': bench_encode(sizes, repeat) + bench_encode(sizes, repeat, statetables='lru'),
+            'check': bench_check(checkcalls, repeat),
+            'solve': bench_solve(codes, repeat, batchsize)}
+
+
+def metrics(results):
+    """
+    Flattens a results dictionary into {metric name: (value, higher is better)} for comparisons.
+    Results from before the cold/warm split are read as cold.
+    """
+    flat = {}
+    for row in results['encode']:
+        flat[f"encode/{row['letters']}/{row['statetables']}/{row.get('cache', 'cold')}"] = (row['letters_per_second'], True)
+    checks = results['check'] if isinstance(results['check'], list) else [results['check']]
+    for row in checks:
+        flat[f"check/{row.get('cache', 'cold')}/calls_per_second"] = (row['calls_per_second'], True)
+    for row in results['solve']:
+        flat[f"solve/{row['scenario']}/{row['batchsize']}"] = (row['seconds'], False)
+    return flat
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Lists the metrics that got worse than the baseline by more than tolerance (a fraction), as readable lines.
+    A scenario that solved in the baseline but not any more is always a regression.
+    """
+    regressions = []
+    current, previous = metrics(results), metrics(baseline)
+    for name, (value, higher) in current.items():
+        if name not in previous:
+            continue
+        old = previous[name][0]
+        change = (value - old) / old if old else 0.0
+        if (higher and change < -tolerance) or (not higher and change > tolerance):
+            regressions.append(f"{name}: {old:.6g} -> {value:.6g} ({change:+.1%})")
+    solved = {row['scenario'] for row in results['solve'] if row['solved']}
+    for row in baseline['solve']:
+        if row['solved'] and row['scenario'] in {r['scenario'] for r in results['solve']} and row['scenario'] not in solved:
+            regressions.append(f"solve/{row['scenario']}: no longer solved")
+    return regressions
+
+
+if __name__ == "__main__":
+    """
+    python -m enigma.Benchmark --output results.json
+    python -m enigma.Benchmark --compare results.json   (exits with status 1 on a regression)
+    """
+    parser = argparse.ArgumentParser(description="Time the Enigma encoder and the Bombe, writing the results as JSON.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="synthetic message lengths")
+    parser.add_argument('--codes', nargs='+', default=DEFAULT_CODES, help="worked codes to solve, e.g. 'Code 3'")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement, the fastest is kept")
+    parser.add_argument('--check-calls', type=int, default=2000, help="Bombe._check calls to time")
+    parser.add_argument('--batchsize', type=int, default=None, help="run the Bombe in NumPy batch mode")
+    parser.add_argument('--output', help="write the JSON here instead of standard output")
+    parser.add_argument('--compare', help="baseline JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed slowdown as a fraction (default 0.1)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.codes, args.repeat, args.check_calls, args.batchsize)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump(results, outfile, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, "r") as infile:
+            regressions = compare(results, json.load(infile), args.tolerance)
+        for line in regressions:
+            print("Regression:", line, file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,21 @@
+class Bitset:
+    """
+    Fixed-size set of the integers 0 to size-1, one bit each in a bytearray.
+    Supports the same `in` and add() as a set, so it can stand in for one wherever the members are small integers,
+     e.g. the Bombe's ring/position equivalence classes.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.bits = bytearray((size + 7) >> 3)
+
+    def __contains__(self, index):
+        return (self.bits[index >> 3] >> (index & 7)) & 1 == 1
+
+    def add(self, index):
+        self.bits[index >> 3] |= 1 << (index & 7)
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+
+    def __len__(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
@@ -1,12 +1,83 @@
-from enigma.Enigma import Enigma
-from enigma.Settings import Settings
+from enigma.Enigma import Enigma, stepping_sequence, STEPPING_CACHE_MAX_LENGTH
+from enigma.Plugboard import Plugboard
+from enigma.Settings import load_catalogue
+from enigma.Bitset import Bitset
+import datetime
+import functools
+import hashlib
 import string
 import itertools
+import copy
+import heapq
+import json
+import time
 import os
-import csv
+
+#Set in every worker process of Bombe.solve_parallel; once it is set all shards stop searching
+_stop_event = None
+
+#Largest number of ring/position equivalence classes tracked in a Bitset; beyond it a set of packed keys is used
+EQUIVALENCE_BITSET_LIMIT = 1 << 26
+
+#Compiled reflector variants kept by reflector_table, enough for every variant of A, B and C
+REFLECTOR_TABLE_CACHE_SIZE = 1 << 15
+
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+
+def _solve_shard(bombe, shard):
+    """
+    Runs the ordinary recursive search on one shard of the key space inside a worker process.
+    Returns (settings, plaintext) for a solution, otherwise None.
+    """
+    worker = bombe._shard(shard)
+    worker.stop = _stop_event
+    plaintext = worker.solve()
+    if plaintext is None:
+        return None
+    return worker.solution, plaintext
+
+
+@functools.lru_cache(maxsize=REFLECTOR_TABLE_CACHE_SIZE)
+def reflector_table(wiring):
+    """
+    Compiled map of a reflector wiring string as a tuple of letter indices, cached so each variant is compiled once.
+    """
+    return tuple(ord(letter) - ord('A') for letter in wiring)
+
+
+def rewired_reflectors(wiring):
+    """
+    Generator over the reflectors made from wiring by rewiring exactly two disjoint pairs of its wires.
+    A pair of wires {a-b, c-d} can be rewired as a-c b-d or a-d b-c. The two pairs are taken from a canonically
+     ordered choice of four wires and one of its three splits into two pairs, so every variant comes out exactly once:
+     C(13,4) * 3 * 2 * 2 = 8580 variants, each a mapping string.
+    """
+    wires = [(i, ord(letter) - ord('A')) for i, letter in enumerate(wiring) if i < ord(letter) - ord('A')]
+    for w1, w2, w3, w4 in itertools.combinations(wires, 4):
+        for first, second in (((w1, w2), (w3, w4)), ((w1, w3), (w2, w4)), ((w1, w4), (w2, w3))):
+            for (a, b), (c, d) in (first, (first[0], first[1][::-1])):
+                for (e, f), (g, h) in (second, (second[0], second[1][::-1])):
+                    variant = list(wiring)
+                    for x, y in ((a, c), (b, d), (e, g), (f, h)):
+                        variant[x], variant[y] = chr(y + ord('A')), chr(x + ord('A'))
+                    yield ''.join(variant)
+
+
+def print_progress(progress):
+    """
+    Progress callback for Bombe.solve that prints one line per report.
+    """
+    eta = datetime.timedelta(seconds=round(progress['eta'])) if progress['eta'] is not None else '?'
+    print(f"{progress['percent']:6.2f}% {progress['done']}/{progress['total']} candidates, "
+          f"{progress['rate']:.0f}/s, ETA {eta}")
+
 
 class Bombe:
-    def __init__(self, code, cribs, knownsettings, permittedsettings):
+    def __init__(self, code, cribs, knownsettings, permittedsettings, batchsize=None, cribpos=None, metrics=None):
         """
         - code:      the ciphertext string
         - cribs:     the known plaintext substring
@@ -16,6 +87,15 @@ class Bombe:
         - permittedsettings: dictionary, mapping each of the five stages either to:
              • a single setting string containing all the possible options separated by a space (for elements with mappings)
              • empty if not applicable or no restrictions (for elements with ranges)
+        - batchsize: if given and the plugboard is fully known, the ring/position sweep runs through the NumPy batch engine
+             (enigma.Batch) this many candidates at a time instead of one Enigma per candidate
+        - cribpos: the offset of the crib in the plaintext if it is known, so that only that window is decoded
+        - metrics: an optional enigma.Metrics object. Per stage it counts the options tried ('bombe.<stage>.tried') and
+             pruned without a check ('bombe.<stage>.pruned': reflector variants that contradict the crib, ring/position
+             equivalence, plugboards that reuse a letter), keeps a latency histogram
+             of _check ('bombe.check') and times variant generation in _tamper ('bombe.tamper'), the plugboard
+             enumeration ('bombe.plugboard.enumerate') and batch decryption ('bombe.batch').
+             The machines it compiles report into it as well. solve_parallel workers fill their own copies.
         """
         self.code = code
         self.cribs = cribs
@@ -34,176 +114,602 @@ class Bombe:
         for stage in self.stages:
             v = permittedsettings[stage].split()
             self.permitted_options[stage] = v
-        # 3) For pruning: keep track of which candidates have already failed
-        self.discard = {stage: set() for stage in self.stages} #the discard pile per stage in the specific order embedded in self.stages to allow backtracking and efficient pruning
+        # 3) Parallel search: the settings of the last solution, a stop flag shared by the workers and the slice of reflector variants to try
+        self.solution = None
+        self.stop = None
+        self.variantrange = None
+        self.batchsize = batchsize
+        # 4) Ring/position equivalence classes already searched, and the notches of the current wheel order
+        self.equivalent = set()
+        self.notches = []
+        # 5) Crib placements: an Enigma never encodes a letter to itself, so offsets where crib and code share a letter are impossible
+        if cribpos is not None:
+            if not 0 <= cribpos <= len(code) - len(cribs):
+                raise ValueError(f"cribpos must be between 0 and {len(code) - len(cribs)} for this code and crib, got {cribpos}")
+            offsets = [cribpos]
+        else:
+            offsets = range(len(code) - len(cribs) + 1)
+        self.codeindex = [ord(c) - ord('A') for c in code] #letter indices used by _check
+        self.cribindex = [ord(c) - ord('A') for c in cribs]
+        self.alloffsets = list(offsets)
+        self.criboffsets = [o for o in offsets
+                            if all(code[o + j] != letter for j, letter in enumerate(cribs))]
+        # 6) Candidates are packed integer keys, the mixed-radix number of the option indexes of the reflector, rotor, ring
+        #    and position stages; settings dictionaries are only built for a solution. sizes holds the radix of each stage
+        self.sizes = None
+        self.resume = None
+        self.tracking = False
+        self.nvariants = None
+        self.plugdomains = None
+        # 7) The reflector and wheel order of the branch being searched
+        self.reflector = None
+        self.rotornames = None
+        self.metrics = metrics
 
 
-    def solve(self):
+    def solve(self, checkpoint=None, interval=60.0, progress=None):
         """
         Starts the recursive search in the self.stages order with each method calling the deeper level.
         At the bottom the recursion does one of two options:
-        - if no solution - discards the setting and bubbles up None
+        - if no solution - bubbles up None and the stage above moves on to its next option
         - if solution - bubbles up the decoded cypher text.
         Whether a valid solution is obtained is determined by a _check method.
-        The _check method simply generates an Enigma object with the settings passed by the Plugboard and attempts to decode the cypher text.
-        If the crib is found somewhere in the attempt, it returns the decoded string, otherwise returns None.
+        The _check method takes the compiled machine of the branch and the plugboard table of a candidate and tries each possible
+         crib placement letter by letter, giving up on a placement at its first mismatch.
+        If the crib fits somewhere, it returns the decoded string, otherwise returns None.
+        Long runs can be stopped and restarted:
+        - checkpoint: path of a checkpoint file. If it exists the search resumes where it left off, and while running
+           the search saves its place there every interval seconds and once more at the end
+        - progress: callable taking a dictionary with done, total, percent, rate (candidates per second) and eta (seconds),
+           called every interval seconds and at the end; print_progress prints it
+        A candidate is one reflector/rotors/rings/positions combination, with all of its plugboards.
         """
-        # start with a settings dict; values will be strings
-        settings = {stage: 'x' for stage in self.stages}
-        return self._search_reflector(settings)
+        self._begin(checkpoint, interval, progress)
+        if self.done >= self.total:
+            return None #the checkpoint says the whole key space has been searched
+        solution = self._search_reflector()
+        if solution is None and not self._stopped():
+            self.done = self.total
+        if self.tracking:
+            self._report()
+        return solution
 
+    def _begin(self, checkpoint, interval, progress):
+        """
+        Sets up progress tracking for solve: the stage sizes, the checkpoint to resume from and the reporting clock.
+        """
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.progress = progress
+        self.tracking = checkpoint is not None or progress is not None
+        self.sizes = [sum(self._reflector_counts()),
+                      self._product_size(self._rotor_domains()),
+                      self._product_size(self._ring_domains()),
+                      self._product_size(self._position_domains())]
+        self.total = self._product_size(self.sizes)
+        self.done = 0
+        self.resume = None
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint, "r") as checkpointfile:
+                saved = json.load(checkpointfile)
+            if saved['fingerprint'] != self._fingerprint():
+                raise ValueError(f"Checkpoint {checkpoint} was saved by a different search")
+            self.done = saved['done']
+            if self.done < self.total:
+                #mixed-radix digits of the first candidate still to search, one per stage
+                self.resume = []
+                rest = self.done
+                for size in reversed(self.sizes):
+                    rest, digit = divmod(rest, size)
+                    self.resume.insert(0, digit)
+        self.resumed = self.done
+        self.started = time.monotonic()
+        self.nextreport = self.started + interval
 
+    @staticmethod
+    def _product_size(sizes):
+        total = 1
+        for size in sizes:
+            total *= size if isinstance(size, int) else len(size)
+        return total
+
+    def _fingerprint(self):
+        """
+        Identifies the search a checkpoint belongs to: the message, the crib and the settings.
+        """
+        search = [self.code, self.cribs, self.known_options, self.permitted_options, self.alloffsets, self.variantrange]
+        return hashlib.sha1(json.dumps(search, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _resume_from(self, level):
+        """
+        Index at which the loop of a stage starts: the checkpointed one while the search is on its way back to it, otherwise 0.
+        """
+        if self.resume is None:
+            return 0
+        start = self.resume[level]
+        if level == len(self.resume) - 1:
+            self.resume = None #back at the checkpoint, every later loop starts from the beginning
+        return start
+
+    def _advance(self, key):
+        """
+        Marks every candidate up to the packed key as searched, then reports and saves a checkpoint if the interval has passed.
+        """
+        if not self.tracking:
+            return
+        self.done = key + 1
+        now = time.monotonic()
+        if now >= self.nextreport:
+            self.nextreport = now + self.interval
+            self._report()
+
+    def _report(self):
+        """
+        Saves the checkpoint, written to a temporary file first so a kill never leaves a half-written one, and calls progress.
+        """
+        if self.checkpoint is not None:
+            temporary = self.checkpoint + '.tmp'
+            with open(temporary, "w") as checkpointfile:
+                json.dump({'fingerprint': self._fingerprint(), 'done': self.done, 'total': self.total}, checkpointfile)
+            os.replace(temporary, self.checkpoint)
+        if self.progress is not None:
+            elapsed = time.monotonic() - self.started
+            rate = (self.done - self.resumed) / elapsed if elapsed > 0 else 0.0
+            self.progress({'done': self.done,
+                           'total': self.total,
+                           'percent': 100.0 * self.done / self.total if self.total else 100.0,
+                           'rate': rate,
+                           'eta': (self.total - self.done) / rate if rate > 0 else None})
+
+    def solve_parallel(self, processes=None, shardsize=2000):
+        """
+        Same search as solve(), with the key space split into independent shards run on a pool of processes.
+        A shard is one reflector and one rotor order, or for the rewired reflector D a run of shardsize variants.
+        As soon as one worker finds the crib every other worker is told to stop.
+        Returns (settings, plaintext), or None if no shard finds the crib.
+        If several settings produce the crib, whichever shard finishes first wins.
+        Shards are submitted lazily, at most two per worker in flight, so a hit stops the search without the rest
+         of the key space (and a pickled copy of the Bombe per shard) sitting in the queue.
+        The work is CPU bound, so the gain is about the number of cores: on a single core machine Code 3 took
+         15.8 s with solve(), 16.7 s with 1 worker and 15.4 s with 4, where only the earlier stop helps.
+        """
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED #imported here to keep the Bombe quick to import
+        import multiprocessing
+        stop = multiprocessing.Event()
+        processes = processes or os.cpu_count() or 1
+        shards = self._shards(shardsize)
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(stop,)) as pool:
+            pending = set()
+            for shard in itertools.islice(shards, 2 * processes):
+                pending.add(pool.submit(_solve_shard, self, shard))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result is not None:
+                        stop.set()
+                        for other in pending:
+                            other.cancel()
+                        return result
+                for shard in itertools.islice(shards, len(done)):
+                    pending.add(pool.submit(_solve_shard, self, shard))
+        return None
+
+    def _shards(self, shardsize):
+        """
+        Splits the reflector and rotor stages into shards (reflector template, reflector, rotors, variant range).
+        """
+        rotordomains = []
+        for templ in self.known_options['Rotors']:
+            if templ == 'x':
+                rotordomains.append(self.permitted_options['Rotors'])
+            else:
+                rotordomains.append([templ])
+        rotorkeys = [' '.join(combo) for combo in itertools.product(*rotordomains)]
+
+        for refl in self.known_options['Reflector']:
+            if refl == 'x':
+                for value in self.permitted_options['Reflector']:
+                    for rotors in rotorkeys:
+                        yield ('x', value, rotors, None)
+            elif refl == 'D':
+                nvariants = sum(1 for _ in self._reflector_variants())
+                for rotors in rotorkeys:
+                    for start in range(0, nvariants, shardsize):
+                        yield ('D', 'D', rotors, (start, min(start + shardsize, nvariants)))
+            else:
+                for rotors in rotorkeys:
+                    yield (refl, refl, rotors, None)
+
+    def _shard(self, shard):
+        """
+        A copy of this Bombe whose search is restricted to one shard from _shards.
+        """
+        template, refl, rotors, variantrange = shard
+        worker = copy.copy(self)
+        worker.known_options = dict(self.known_options)
+        worker.permitted_options = dict(self.permitted_options)
+        worker.known_options['Reflector'] = [template]
+        if template == 'x':
+            worker.permitted_options['Reflector'] = [refl]
+        worker.known_options['Rotors'] = rotors.split()
+        worker.variantrange = variantrange
+        return worker
+
+    def _stopped(self):
+        """
+        True once another worker of a parallel search has found the solution.
+        """
+        return self.stop is not None and self.stop.is_set()
+
+
+
+    def solve_statistical(self, topk=10, scorer=None):
+        """
+        Ciphertext-only attack, for traffic without a crib.
+        1) Every reflector, wheel order and wheel offset (start position less ring) is tried exhaustively, with only
+           the fully known plug leads, and scored by index of coincidence; the best topk are kept in a heap.
+           A wheel with an unknown position sweeps its positions with the ring at its known value or the first permitted one;
+           a wheel with a known position and an unknown ring sweeps its rings instead, so a known position is never changed.
+        2) For each of those, the unknown rings and then the unknown plug leads are optimised by hill-climbing
+           on the scorer's n-gram log-likelihood (English letter frequencies unless a Scorer is passed in).
+        Returns a list of (score, settings, plaintext), best first.
+        The rewired reflector D is not enumerated here; 'D' means the D wiring in the catalogue.
+        """
+        from enigma.Scoring import Scorer, index_of_coincidence
+        if scorer is None:
+            scorer = Scorer()
+        reflectors = []
+        for refl in self.known_options['Reflector']:
+            reflectors.extend(self.permitted_options['Reflector'] if refl == 'x' else [refl])
+        rotordomains = []
+        for templ in self.known_options['Rotors']:
+            rotordomains.append(self.permitted_options['Rotors'] if templ == 'x' else [templ])
+        plugboard = ' '.join(templ for templ in self.known_options['Plugboard'] if 'x' not in templ)
+        positiondomains = self._position_domains()
+        ringdomains = []
+        for j, templ in enumerate(self.known_options['Rings']):
+            if templ != 'x':
+                ringdomains.append([templ])
+            elif self.known_options['Positions'][j] != 'x': #the offset can only move through the ring
+                ringdomains.append(self._ring_domains()[j])
+            else: #the position search covers the offset, so any permitted ring will do
+                ringdomains.append(self._ring_domains()[j][:1])
+
+        #1) exhaustive wheel order and offset search, one machine per wheel order and rings with only the start positions changing
+        heap = [] #min-heap of (ioc, tiebreak, reflector, rotors, rings, positions)
+        tiebreak = itertools.count()
+        for refl in reflectors:
+            for combo in itertools.product(*rotordomains):
+                rotors = ' '.join(combo)
+                for ringcombo in itertools.product(*ringdomains):
+                    rings = ' '.join(ringcombo)
+                    machine = Enigma({'Reflector': refl, 'Rotors': rotors, 'Rings': rings,
+                                      'Positions': ' '.join('A' * len(combo)), 'Plugboard': plugboard})
+                    for positions in itertools.product(*positiondomains):
+                        if self._stopped():
+                            return []
+                        machine.positions = [ord(p) - ord('A') for p in positions]
+                        ioc = index_of_coincidence([ord(c) - ord('A') for c in machine.enigma_encode(self.code)])
+                        entry = (ioc, next(tiebreak), refl, rotors, rings, ' '.join(positions))
+                        if len(heap) < topk:
+                            heapq.heappush(heap, entry)
+                        else:
+                            heapq.heappushpop(heap, entry)
+
+        #2) hill-climb rings and plug leads on the best candidates
+        results = []
+        for ioc, _, refl, rotors, rings, positions in heap:
+            s = {'Reflector': refl, 'Rotors': rotors, 'Rings': rings, 'Positions': positions, 'Plugboard': plugboard}
+            s = self._climb_rings(s, scorer)
+            s, score = self._climb_plugboard(s, scorer)
+            results.append((score, s, Enigma(s).enigma_encode(self.code)))
+        results.sort(key=lambda result: result[0], reverse=True)
+        return results
+
+    def _score(self, settings, scorer):
+        return scorer.score([ord(c) - ord('A') for c in Enigma(settings).enigma_encode(self.code)])
+
+    def _climb_rings(self, settings, scorer):
+        """
+        Optimises each unknown ring, right to left.
+        Where the start position is unknown too, the position moves along with the ring so the wheel's wiring offset stays put
+         and only the turnover point changes; the leftmost wheel never steps, so its ring is already covered by the start
+         position search. Where the position is known it is kept and the ring moves alone, changing the offset as well.
+        """
+        if self.permitted_options['Rings']:
+            ringoptions = [int(r) for r in self.permitted_options['Rings']]
+        else:
+            ringoptions = range(1, 27)
+        best = settings
+        bestscore = self._score(settings, scorer)
+        for j in range(self.nrotors - 1, -1, -1):
+            if self.known_options['Rings'][j] != 'x':
+                continue
+            knownposition = self.known_options['Positions'][j] != 'x'
+            if j == 0 and not knownposition:
+                continue
+            rings = [int(r) for r in best['Rings'].split()]
+            positions = best['Positions'].split()
+            for ring in ringoptions:
+                trialrings = list(rings)
+                trialrings[j] = ring
+                trialpositions = list(positions)
+                if not knownposition:
+                    trialpositions[j] = chr((ord(positions[j]) - ord('A') + ring - rings[j]) % 26 + ord('A'))
+                s = dict(best, Rings=' '.join(str(r).zfill(2) for r in trialrings), Positions=' '.join(trialpositions))
+                score = self._score(s, scorer)
+                if score > bestscore:
+                    best, bestscore = s, score
+        return best
+
+    def _climb_plugboard(self, settings, scorer):
+        """
+        Fills the unknown plug leads greedily: each round adds the lead that improves the score most,
+         until every unknown slot is used or no lead improves the score.
+        Returns (settings, score).
+        """
+        templates = self.known_options['Plugboard']
+        chosen = {} #slot -> lead
+        used = {c for templ in templates for c in templ if c != 'x'}
+        bestscore = self._score(settings, scorer)
+        while True:
+            open_slots = [slot for slot, templ in enumerate(templates) if 'x' in templ and slot not in chosen]
+            trials = [] #(slot, lead)
+            freeslots = [slot for slot in open_slots if templates[slot] == 'xx']
+            if freeslots: #all "xx" slots are alike, so only the first open one is tried
+                trials.extend((freeslots[0], a + b) for a, b in itertools.combinations(string.ascii_uppercase, 2)
+                              if a not in used and b not in used)
+            for slot in open_slots:
+                if templates[slot] != 'xx':
+                    trials.extend((slot, templates[slot].replace('x', L)) for L in string.ascii_uppercase if L not in used)
+            best = None
+            for slot, lead in trials:
+                leads = dict(chosen)
+                leads[slot] = lead
+                s = dict(settings, Plugboard=self._plugboard_key(leads))
+                score = self._score(s, scorer)
+                if score > bestscore:
+                    best, bestscore = (slot, lead), score
+            if best is None:
+                break
+            chosen[best[0]] = best[1]
+            used.update(best[1])
+        s = dict(settings, Plugboard=self._plugboard_key(chosen))
+        return s, bestscore
+
+    def _plugboard_key(self, chosen):
+        """
+        Plugboard string from the known leads plus the leads chosen for unknown slots; unfilled slots are left out.
+        """
+        leads = []
+        for slot, templ in enumerate(self.known_options['Plugboard']):
+            if 'x' not in templ:
+                leads.append(templ)
+            elif slot in chosen:
+                leads.append(chosen[slot])
+        return ' '.join(leads)
 
     #Stage 1: Reflector
-    def _search_reflector(self, settings):
-        self.discard['Reflector'].clear() #purges the discard pile once we move forward to avoid rejecting valid solutions
+    def _reflector_counts(self):
+        """
+        Number of reflector options behind each template: the permitted reflectors for 'x', the variants for 'D', else 1.
+        """
+        counts = []
         for refl in self.known_options['Reflector']:
+            if refl == 'x':
+                counts.append(len(self.permitted_options['Reflector']))
+            elif refl == 'D':
+                if self.nvariants is None:
+                    self.nvariants = sum(1 for _ in self._reflector_variants())
+                if self.variantrange is not None:
+                    counts.append(len(range(self.nvariants)[slice(*self.variantrange)]))
+                else:
+                    counts.append(self.nvariants)
+            else:
+                counts.append(1)
+        return counts
+
+    def _reflector_option(self, index):
+        """
+        (template, element, wiring) of a reflector option index, as enumerated by _search_reflector.
+        Variants of 'D' are generated again up to the index, so this is only meant for materialising a solution.
+        """
+        catalogue = load_catalogue()
+        for refl, count in zip(self.known_options['Reflector'], self._reflector_counts()):
+            if index < count:
+                if refl == 'x':
+                    value = self.permitted_options['Reflector'][index]
+                    return refl, value, catalogue[value]['wiring']
+                if refl == 'D':
+                    first = self.variantrange[0] if self.variantrange is not None else 0
+                    return refl, 'D', next(itertools.islice(self._reflector_variants(), first + index, None))
+                return refl, refl, catalogue[refl]['wiring']
+            index -= count
+        raise IndexError(f"Reflector option {index} out of range")
+
+    @staticmethod
+    def _unpack(index, domains):
+        """
+        The values of the index-th combination of itertools.product(*domains).
+        """
+        values = []
+        for domain in reversed(domains):
+            index, digit = divmod(index, len(domain))
+            values.append(domain[digit])
+        return values[::-1]
+
+    def _settings(self, key, leads):
+        """
+        Materialises the settings dictionary of a packed candidate key and its plug leads, for reporting a solution.
+        The key is the mixed-radix number of the reflector, rotors, rings and positions indexes, positions fastest.
+        """
+        key, positions = divmod(key, self.sizes[3])
+        key, rings = divmod(key, self.sizes[2])
+        reflector, rotors = divmod(key, self.sizes[1])
+        template, element, wiring = self._reflector_option(reflector)
+        settings = {'Reflector': element,
+                    'Rotors': ' '.join(self._unpack(rotors, self._rotor_domains())),
+                    'Rings': ' '.join(self._unpack(rings, self._ring_domains())),
+                    'Positions': ' '.join(self._unpack(positions, self._position_domains())),
+                    'Plugboard': ' '.join(leads)}
+        if template == 'D':
+            settings['ReflectorWiring'] = wiring #the rewired variant, which Settings uses instead of the CSV mapping
+        return settings
+
+    #Stage 1: Reflector
+    def _search_reflector(self):
+        catalogue = load_catalogue()
+        start = self._resume_from(0) #first reflector option not yet searched
+        first = 0 #index of the first option of the current template
+        for refl, count in zip(self.known_options['Reflector'], self._reflector_counts()):
+            skip = min(max(start - first, 0), count) #options of this template searched before the checkpoint
             if refl=='x': #unknown reflector, so used each permitted value in turn and recurses
-               for value in self.permitted_options['Reflector']:
-                   s = settings.copy() #avoid scrambling the main settings file
-                   s['Reflector'] = value
-                   solution = self._search_rotors(s) #the recursive call
+               for index, value in enumerate(self.permitted_options['Reflector'][skip:], first + skip):
+                   if self.metrics is not None:
+                       self.metrics.count('bombe.reflector.tried')
+                   self.reflector = {'element': value, 'wiring': catalogue[value]['wiring'], 'map': catalogue[value]['forward']} #the reflector of this branch
+                   solution = self._search_rotors(index) #the recursive call
                    if solution is not None: #bubbles up either None or the decoded string
                        return solution
-                   self.discard['Reflector'].add(s['Reflector']) #discard the unsuccessful setting and iterate again
             elif refl == 'D': #custom reflector that calls a _tamper function and generates new reflector mappings
-                s = settings.copy()
                 # delegate to tamper stage
-                s['Reflector'] = 'D'
-                solution = self._tamper(s)
+                solution = self._tamper(first, skip)
                 if solution is not None:
                     return solution
-            else: #known reflector, recurses
-                s = settings.copy()
-                s['Reflector'] = refl
-                solution = self._search_rotors(s)
+            elif not skip: #known reflector, recurses
+                if self.metrics is not None:
+                    self.metrics.count('bombe.reflector.tried')
+                self.reflector = {'element': refl, 'wiring': catalogue[refl]['wiring'], 'map': catalogue[refl]['forward']}
+                solution = self._search_rotors(first)
                 if solution is not None:
                     return solution
+            first += count
         return None
 
-    def _tamper(self, settings):
+    def _tamper(self, first=0, skip=0):
         """
         A method to tamper with the reflector board by scrambling four plugleads i.e. changing the mapping for eight letters.
-        The method creates three list for the three permitted reflectors` mappings.
-        For each list it reassigns four pairs in all possible ways,
-         with each variant being written as a mapping in the CSVMapping.csv, the source for all mappings.
-        From that point, _tamper recurses.
-        When finally _check creates an Enigma with the settings file,
-         the Settings object reads the mapping from element='D' in CSVMapping.csv.
-        From there Enigma decodes as usual and returns the decoded string.
-        _check bubbles up the result. If it reaches _tamper, it tries another variant of the four pairs and writes over D element in the csv.
-        When all variants are exhausted, another set of pairs is created until a solution is found.
-        """
-        newsettings = Settings(settings)
-        mapreflector=newsettings.load_mapping() #loads the CSV mapping in a suitable format
-        maps=[None]*3
-        maps[0]=mapreflector['A']['wiring']
-        maps[1]=mapreflector['B']['wiring']
-        maps[2]=mapreflector['C']['wiring']
-        for map in maps: #first tries reflector A, then B, then C
-            wiring=list(map) #creates a list from the mapping
-            pairs = []
-            for i, letter in enumerate(wiring): #list of pairs between the alphabet index and the mapping index
-                j = ord(letter) - ord('A') #convert to an index
-                if i < j:
-                    pairs.append((i, j)) #create a list of pairs
-
-            #For each choice of two distinct reflector wires (you have to scramble exactly two wires per go):
-            for (i1, i2), (i3, i4) in itertools.combinations(pairs, 2):
-                #Option A of first swap: reconnect i1–i3 & i2–i4
-                interm1 = wiring.copy()
-                interm1[i1], interm1[i3] = wiring[i3], wiring[i1]
-                interm1[i2], interm1[i4] = wiring[i4], wiring[i2]
-
-                #Option B of first swap: reconnect i1–i4 & i2–i3
-                interm2 = wiring.copy()
-                interm2[i1], interm2[i4] = wiring[i4], wiring[i1]
-                interm2[i2], interm2[i3] = wiring[i3], wiring[i2]
-
-                for interm in (interm1, interm2): #scramble another two wires for each combination produced above
-                    #remove the two just-used pairs to ensure no repetition
-                    remaining = [p for p in pairs if p not in ((i1, i2), (i3, i4))]
-
-                    #second swap: pick two more from the remaining 11
-                    for (i5, i6), (i7, i8) in itertools.combinations(remaining, 2):
-                        # Option A₂: reconnect i5–i7 & i6–i8
-                        final1 = interm.copy()
-                        final1[i5], final1[i7] = interm[i7], interm[i5]
-                        final1[i6], final1[i8] = interm[i8], interm[i6]
-                        wA = ''.join(final1) #mapping variant 1
-
-
-                        # Option B₂: reconnect i5–i8 & i6–i7
-                        final2 = interm.copy()
-                        final2[i5], final2[i8] = interm[i8], interm[i5]
-                        final2[i6], final2[i7] = interm[i7], interm[i6]
-                        wB = ''.join(final2) #mapping variant 2
-
-                        wiringvariants = wA, wB #tuple to iterate
-
-
-                        for wiringvariant in wiringvariants: #variant one writing in the csv file
-                            base_dir = os.path.dirname(__file__)
-                            csv_path = os.path.normpath(os.path.join(base_dir, "..", "wiring", "CSVMapping.csv"))
-                            with open(csv_path, "r", encoding="utf-8-sig", newline="") as csvfile:
-                                 reader = csv.DictReader(csvfile)
-                                 # Each row is a dict with keys "name", "wiring", "notch"
-                                 fieldnames = reader.fieldnames or ['Element', 'Wiring', 'Notch']
-                                 rows = list(reader)
-
-                            for row in rows:
-                                if row.get('Element', '') == 'D':
-                                   row['Wiring'] = wiringvariant
-                                   row['Notch'] = ''
-
-                            # Write everything back
-                            with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
-                                 writer = csv.DictWriter(f, fieldnames=fieldnames)
-                                 writer.writeheader()
-                                 writer.writerows(rows)
-
-                            s = settings.copy()
-                            s['Reflector'] = 'D' #pass reflector D below so that the Enigma reads the generated mapping in the csv
-                            solution = self._search_rotors(s)
-                            if solution is not None:
-                               return solution
+        Each variant produced by _reflector_variants is passed down in memory as the reflector of the branch,
+         and a solution's settings carry it under 'ReflectorWiring', which Settings uses instead of the CSV mapping for 'D'.
+        Nothing is written to CSVMapping.csv, so the search is bound by CPU and several Bombes can run side by side.
+        From that point, _tamper recurses and _check decodes with the variant as usual.
+        _check bubbles up the result. If it reaches _tamper, it tries the next variant until a solution is found.
+        When only the reflector is unknown, a variant that contradicts the crib at every offset (see _reflector_constraints)
+         is skipped without searching below it.
+        first is the reflector option index of the first variant, and the first skip variants were searched before the checkpoint.
+        """
+        variants = self._reflector_variants()
+        if self.variantrange is not None:
+            variants = itertools.islice(variants, *self.variantrange) #only this shard's variants
+        variants = itertools.islice(variants, skip, None)
+        if self.metrics is not None:
+            variants = self.metrics.timed('bombe.tamper', variants)
+        constraints = self._reflector_constraints()
+        for index, wiringvariant in enumerate(variants, first + skip):
+            if self._stopped():
+                return None
+            if self.metrics is not None:
+                self.metrics.count('bombe.reflector.tried')
+            reflectormap = reflector_table(wiringvariant)
+            if constraints is not None and not any(all(reflectormap[x] == y for x, y in wires.items()) for wires in constraints):
+                if self.metrics is not None:
+                    self.metrics.count('bombe.reflector.pruned')
+                self._advance((index + 1) * self.sizes[1] * self.sizes[2] * self.sizes[3] - 1) #its whole subtree is searched
+                continue #the crib fits at no offset with this reflector
+            self.reflector = {'element': 'D', 'wiring': wiringvariant, 'map': reflectormap} #the machines are compiled with the generated mapping
+            solution = self._search_rotors(index)
+            if solution is not None:
+               return solution
         return None
 
+    def _reflector_variants(self):
+        """
+        Generates the rewired reflector mappings: every variant of reflector A, then B, then C, as mapping strings.
+        Each one comes out once, in the canonical order of rewired_reflectors.
+        """
+        mapreflector=load_catalogue() #the shared wiring catalogue, no disk access after the first load
+        seen=set()
+        for base in ('A', 'B', 'C'):
+            for variant in rewired_reflectors(mapreflector[base]['wiring']):
+                if variant not in seen: #no variant of one base is also a variant of another, but guard against it
+                    seen.add(variant)
+                    yield variant
+
+    def _reflector_constraints(self):
+        """
+        When everything but the reflector is known, the wires each crib placement needs in the reflector.
+        At keypress i the ciphertext letter c and the crib letter p meet in the middle of the machine:
+         the reflector has to join plug and rotors forward of c with plug and rotors forward of p.
+        Returns one {letter: letter} map per crib offset whose wires do not contradict each other,
+         or None when the rotors, rings, positions or plug leads are not all known.
+        """
+        domains = [self._rotor_domains(), self._ring_domains(), self._position_domains()]
+        if any(len(domain) != 1 for group in domains for domain in group):
+            return None
+        if any('x' in templ for templ in self.known_options['Plugboard']):
+            return None
+        catalogue = load_catalogue()
+        rotors = [{'element': name, 'wiring': catalogue[name]['wiring'], 'notch': catalogue[name]['notch'],
+                   'ring': chr(int(ring) - 1 + ord('A')), 'position': position}
+                  for [name], [ring], [position] in zip(*domains)]
+        reflector = {'element': 'A', 'wiring': catalogue['A']['wiring'], 'map': catalogue['A']['forward']} #only the wheels are used
+        try:
+            machine = Enigma.from_resolved(rotors, reflector, self.known_options['Plugboard'])
+        except ValueError: #the known plugboard reuses a letter, as _search_plugboard would find for every candidate
+            return []
+        if not self.criboffsets:
+            return [] #the crib fits nowhere, whatever the reflector
+        nrotors = len(rotors)
+        first, sequence = self._window(machine, self.criboffsets)
+
+        def middle(letter, i):
+            base = (i - first) * nrotors
+            for j in range(nrotors-1, -1, -1):
+                letter = machine.forwardrows[j][sequence[base+j]][letter]
+            return letter
+
+        constraints = []
+        for offset in self.criboffsets: #a rewired reflector has no fixed points, like A, B and C
+            wires = {}
+            for j, letter in enumerate(self.cribindex):
+                i = offset + j
+                x, y = middle(machine.plugmap[self.codeindex[i]], i), middle(machine.plugmap[letter], i)
+                if x == y or wires.get(x, y) != y or wires.get(y, x) != x:
+                    break #no reflector can join these
+                wires[x], wires[y] = y, x
+            else:
+                constraints.append(wires)
+        return constraints
+
 
 
     # Stage 2: Rotors
-    def _search_rotors(self, settings):
+    def _rotor_domains(self):
         domains = []
         for templ in self.known_options['Rotors']:
             if templ == 'x':
-                domains.append([r for r in self.permitted_options['Rotors']
-                                if r not in self.discard['Rotors']]) #creates a list of possible options removing anything in discard
+                domains.append(self.permitted_options['Rotors']) #every permitted rotor
             else:
                 domains.append([templ]) #if the reflector is known, take the known value
+        return domains
 
-        self.discard['Rotors'].clear()
-
-        for combo in itertools.product(*domains): #creates combinations of the possible and known options
-            rotor_str = list(combo)  # ['Beta', 'III', 'V']
-            key = ' '.join(rotor_str)  # "Beta III V"
-
-            #skip if already discarded
-            if key in self.discard['Rotors']:
-                continue
-
-            s = settings.copy()
-            s['Rotors'] = key
-            solution = self._search_rings(s)
+    def _search_rotors(self, key):
+        domains = self._rotor_domains()
+        start = self._resume_from(1)
+        #creates combinations of the possible and known options, from the checkpoint on
+        for index, combo in itertools.islice(enumerate(itertools.product(*domains)), start, None):
+            if self.metrics is not None:
+                self.metrics.count('bombe.rotors.tried')
+            self.rotornames = combo  # ('Beta', 'III', 'V')
+            solution = self._search_rings(key * self.sizes[1] + index)
             if solution is not None:
                 return solution
-
-            self.discard['Rotors'].add(key)
-
         return None
 
 
     # Stage 3: Rings
-    def _search_rings(self, settings):
+    def _ring_domains(self):
         domains = []
         for templ in self.known_options['Rings']:
             if templ != 'x':
@@ -215,22 +721,109 @@ class Bombe:
                 else:
                     #otherwise generate the full 01–26 range
                     domains.append([str(n).zfill(2) for n in range(1, 27)])
-        self.discard['Rings'].clear()
-        for combo in itertools.product(*domains):
-            key = ' '.join(combo)  # "04 12 19"
-            if key in self.discard['Rings']:
-                continue
-            s = settings.copy()
-            s['Rings'] = key
-            sol = self._search_positions(s)
+        return domains
+
+    def _machine(self, rings):
+        """
+        Compiles the reflector and wheel order of the current branch at the given rings, with the wheels at A.
+        The position and plugboard stages reuse it, only changing its positions and the plugboard table given to _check.
+        """
+        catalogue = load_catalogue()
+        rotors = [{'element': name,
+                   'wiring': catalogue[name]['wiring'],
+                   'notch': catalogue[name]['notch'],
+                   'ring': chr(int(ring) - 1 + ord('A')),
+                   'position': 'A'} for name, ring in zip(self.rotornames, rings)]
+        return Enigma.from_resolved(rotors, self.reflector, [], metrics=self.metrics)
+
+    def _search_rings(self, key):
+        domains = self._ring_domains()
+        self.notches = [load_catalogue()[name]['notch'] for name in self.rotornames]
+        #ring/position classes already searched for this reflector and wheel order, see _equivalence_key;
+        # a bitset over every class pays off for dense sweeps, sparse or very large ones use a set of packed keys
+        nclasses = 26 ** self.nrotors * 27 ** max(self.nrotors - 2, 0)
+        dense = nclasses <= 64 * self.sizes[2] * self.sizes[3]
+        self.equivalent = Bitset(nclasses) if dense and nclasses <= EQUIVALENCE_BITSET_LIMIT else set()
+        if self.batchsize and not any('x' in templ for templ in self.known_options['Plugboard']):
+            return self._sweep_batch(key, domains)
+        start = self._resume_from(2)
+        for index, combo in itertools.islice(enumerate(itertools.product(*domains)), start, None):
+            if self.metrics is not None:
+                self.metrics.count('bombe.rings.tried')
+            sol = self._search_positions(key * self.sizes[2] + index, self._machine(combo), combo)
             if sol is not None:
                 return sol
-            self.discard['Rings'].add(key)
         return None
 
 
+    def _sweep_batch(self, key, ringdomains):
+        """
+        Batch mode of stages 3 and 4: every ring x position candidate for the current reflector and rotors is decoded
+         by the NumPy batch engine, batchsize candidates per call, and only rows containing the crib go on to _search_plugboard.
+        Candidates are visited in the same order as the nested loops, so the first solution is the same one.
+        The batch arrays are built straight from letter indices; a machine is only compiled for the rows that contain the crib.
+        """
+        import numpy as np #NumPy is only needed in batch mode
+        from enigma.Batch import compile_arrays, run_batch, rows_with_crib
+        catalogue = load_catalogue()
+        wirings = np.array([[ord(c) - ord('A') for c in catalogue[name]['wiring']] for name in self.rotornames])
+        notches = np.array([ord(notch) - ord('A') if notch else -1 for notch in self.notches])
+        reflector = np.array([ord(c) - ord('A') for c in self.reflector['wiring']])
+        try:
+            plugboard = np.array(Plugboard(self.known_options['Plugboard']).table)
+        except ValueError: #the known plugboard reuses a letter, so no candidate of this branch can be the key
+            if self.metrics is not None:
+                self.metrics.count('bombe.plugboard.pruned')
+            return None
+
+        positiondomains = self._position_domains()
+        candidates = itertools.product(itertools.product(*ringdomains), itertools.product(*positiondomains))
+        npositions = self.sizes[3]
+        start = self._resume_from(2) * npositions
+        start += self._resume_from(3)
+        candidates = enumerate(itertools.islice(candidates, start, None), start) #indexes count from the first candidate
+        key *= self.sizes[2] * npositions #packed key of the first ring x position candidate of this branch
+        while True:
+            if self._stopped():
+                return None
+            chunk = list(itertools.islice(candidates, self.batchsize))
+            if not chunk:
+                return None
+            batch = [] #(candidate index, rings, positions)
+            for index, (rings, positions) in chunk:
+                equivalencekey = self._equivalence_key(rings, positions)
+                if equivalencekey in self.equivalent:
+                    continue #decodes exactly like a candidate already in a batch
+                self.equivalent.add(equivalencekey)
+                batch.append((index, rings, positions))
+            if self.metrics is not None:
+                self.metrics.count('bombe.positions.tried', len(chunk))
+                self.metrics.count('bombe.positions.pruned', len(chunk) - len(batch))
+            if batch:
+                size = len(batch)
+                arrays = compile_arrays(np.broadcast_to(wirings, (size,) + wirings.shape),
+                                        [[int(ring) - 1 for ring in rings] for _, rings, _ in batch],
+                                        [[ord(p) - ord('A') for p in positions] for _, _, positions in batch],
+                                        np.broadcast_to(notches, (size,) + notches.shape),
+                                        np.broadcast_to(reflector, (size, 26)),
+                                        np.broadcast_to(plugboard, (size, 26)))
+                if self.metrics is not None:
+                    started = time.perf_counter()
+                hits = rows_with_crib(run_batch(arrays, self.code), self.cribs).nonzero()[0]
+                if self.metrics is not None:
+                    self.metrics.add_time('bombe.batch', time.perf_counter() - started)
+                for hit in hits:
+                    index, rings, positions = batch[hit]
+                    machine = self._machine(rings)
+                    machine.positions = [ord(p) - ord('A') for p in positions]
+                    solution = self._search_plugboard(key + index, machine) #confirms, prints and decodes as usual
+                    if solution is not None:
+                        return solution
+            self._advance(key + chunk[-1][0])
+
+
     # Stage 4: Start positions
-    def _search_positions(self, settings):
+    def _position_domains(self):
         domains = []
         for templ in self.known_options['Positions']:
             if templ != 'x':
@@ -241,40 +834,79 @@ class Bombe:
                 else:
                     # otherwise generate the full 01–26 range
                     domains.append(list(string.ascii_uppercase))
-        self.discard['Positions'].clear()
-        for combo in itertools.product(*domains):
-            key = ' '.join(combo)  # "A M Z"
-            if key in self.discard['Positions']:
-                continue
-            s = settings.copy()
-            s['Positions'] = key
-            solution = self._search_plugboard(s)
-            if solution is not None:
-                return solution
-            self.discard['Positions'].add(key)
+        return domains
+
+    def _search_positions(self, key, machine, rings):
+        domains = self._position_domains()
+        start = self._resume_from(3)
+        for index, combo in itertools.islice(enumerate(itertools.product(*domains)), start, None):
+            if self._stopped():
+                return None
+            candidate = key * self.sizes[3] + index
+            equivalencekey = self._equivalence_key(rings, combo)
+            if self.metrics is not None:
+                self.metrics.count('bombe.positions.tried')
+                if equivalencekey in self.equivalent:
+                    self.metrics.count('bombe.positions.pruned')
+            if equivalencekey not in self.equivalent:
+                machine.positions = [ord(p) - ord('A') for p in combo] #combo e.g. ('A', 'M', 'Z')
+                solution = self._search_plugboard(candidate, machine)
+                if solution is not None:
+                    return solution
+                self.equivalent.add(equivalencekey)
+            self._advance(candidate)
         return None
 
+    def _equivalence_key(self, rings, positions):
+        """
+        A wheel's wiring only sees position - ring, so ring/position pairs with the same differences decode alike,
+         except for where turnovers fall. Enigma.step_rotors only looks at the notches of the third wheel onwards,
+         so for those wheels the key also holds the number of steps until the wheel reaches its notch,
+         or 26 if it cannot get there within the message (bounded by how often its right neighbour turns it over).
+        Candidates with equal keys produce identical output over this message.
+        The key is packed into one integer: a base-26 digit per wheel, then a base-27 digit per wheel from the third on.
+        """
+        key = 0
+        for ring, position in zip(rings, positions):
+            key = key * 26 + (ord(position) - ord('A') - int(ring) + 1) % 26
+        bound = len(self.code) - 1 #most steps the rightmost wheel can take before a keypress of this message
+        for j in range(len(positions) - 1, 1, -1):
+            notch = self.notches[j]
+            dist = None
+            if notch:
+                dist = (ord(notch) - ord(positions[j])) % 26
+            if dist is None or dist > bound:
+                key = key * 27 + 26 #never on its notch, so the wheel to its left never steps
+                bound = 0
+            else:
+                key = key * 27 + dist
+                #the wheel to the left steps once per keypress spent on the notch
+                bound = (bound - dist) // 26 + 1 if j == len(positions) - 1 else len(self.code) - 1
+        return key
 
     # Stage 5: Plugboard
-    def _search_plugboard(self, settings):
+    def _plugboard_domains(self):
+        """
+        The options of each plugboard slot as (letter, letter) index pairs, in the orientation they are written in.
+        Built once per Bombe.
+        """
+        if self.plugdomains is not None:
+            return self.plugdomains
         domains = []
-        self.discard['Plugboard'].clear()
         for templ in self.known_options['Plugboard']:
             if len(templ) != 2:
                 raise ValueError(f"Plugboard template must be length 2, got {templ!r}")
             a, b = templ[0], templ[1]
             # Case 1: fully known, e.g. "FL"
             if 'x' not in templ:
-                domains.append([templ])
+                options = [templ]
             # Case 2: both unknown → "xx"
             elif templ == 'xx':
                 if self.permitted_options['Plugboard']:
-                    domains.append(self.permitted_options['Plugboard'])
+                    options = self.permitted_options['Plugboard']
                 else:
                     # fallback to all unordered pairs of letters A–Z
-                    domains.append(
-                        [''.join(p) for p in itertools.combinations(string.ascii_uppercase, 2)]
-                    )
+                    options = [''.join(p) for p in itertools.combinations(string.ascii_uppercase, 2)]
             # Case 3: one known, one unknown → e.g. "Jx" or "xM"
             else:
                 known, pos = (a, 1) if b == 'x' else (b, 0)
@@ -285,115 +917,299 @@ class Bombe:
                     # put the known letter in its fixed spot
                     pair = (L + known) if pos == 0 else (known + L)
                     options.append(pair)
-                domains.append(options)
-        for combo in itertools.product(*domains):
-            key = ' '.join(combo)
-            if key in self.discard['Plugboard']:
-                continue
-            s = settings.copy()
-            s['Plugboard'] = key
-            if self._check(s):
-                return Enigma(s).enigma_encode(self.code)
-            self.discard['Plugboard'].add(key)
-        return None
+            domains.append([(ord(pair[0]) - ord('A'), ord(pair[1]) - ord('A')) for pair in options])
+        self.plugdomains = domains
+        return domains
 
-
-    # Solution
-    def _check(self, settings):
-        enigma = Enigma(settings) #creates an enigma object with settings passed from the recursion
-        pt = enigma.enigma_encode(self.code) #decodes the cypher text using that Enigma
-        for i in range(len(pt) - len(self.cribs) + 1): #traverse the 'decoded' cypher
-            if pt[i:i+len(self.cribs)] == self.cribs: #if we find the crib somewhere, return the crib
+    def _search_plugboard(self, key, machine):
+        domains = self._plugboard_domains()
+        incremental = any('x' in templ for templ in self.known_options['Plugboard'])
+        if incremental:
+            offsets = self._crib_offsets(machine)
+            cores = self._core_sequence(machine, offsets) #shared by the menu and every candidate
+            witnesses = {} #offset -> crib index where the last candidate checked there failed
+            candidates = self._menu_plugboards(machine, domains, cores) #only plugboards consistent with the menu
+        else:
+            candidates = [(0,) * len(domains)] #the one known plugboard, checked by decoding straight away
+        metrics = self.metrics
+        if metrics is not None:
+            candidates = metrics.timed('bombe.plugboard.enumerate', candidates)
+        board = Plugboard([])
+        current = [None] * len(domains) #lead plugged in for each slot, changed slot by slot between candidates
+        touched = set() #letters whose stecker changed since the last check
+        for combo in candidates:
+            if self._stopped():
+                return None
+            if metrics is not None:
+                metrics.count('bombe.plugboard.tried')
+            changed = [slot for slot, option in enumerate(combo) if current[slot] != domains[slot][option]]
+            for slot in changed:
+                if current[slot] is not None:
+                    board.remove(current[slot])
+                    touched.update(current[slot])
+                    current[slot] = None
+            try:
+                for slot in changed:
+                    board.add(domains[slot][combo[slot]])
+                    current[slot] = domains[slot][combo[slot]]
+                    touched.update(current[slot])
+            except ValueError: #a letter on two leads, e.g. a known plugboard that reuses one
+                if metrics is not None:
+                    metrics.count('bombe.plugboard.pruned')
+                continue
+            plugmap = board.table
+            if metrics is not None:
+                started = time.perf_counter()
+            if incremental:
+                found = self._check_incremental(cores, offsets, plugmap, touched, witnesses)
+                touched.clear()
+            else:
+                found = self._check(machine, plugmap)
+            if metrics is not None:
+                metrics.observe('bombe.check', time.perf_counter() - started)
+            if found:
+                leads = [chr(domains[slot][option][0] + ord('A')) + chr(domains[slot][option][1] + ord('A'))
+                         for slot, option in enumerate(combo)]
+                settings = self._settings(key, leads)
                 print(settings) #also print the successul settings for reference
-                return pt #return the decoded string
+                self.solution = settings #and keep them for solve_parallel
+                return Enigma(settings, metrics=metrics).enigma_encode(self.code) #return the decoded string
         return None
 
-#Decoding exercises
-
-
-#Code 1
-
-knownsettings={'Rotors': 'Beta Gamma V',
-                   'Reflector': 'x',
-                   'Rings': '04 02 14',
-                   'Positions': 'M J M',
-                   'Plugboard': 'KI XN FL'}
-
-permittedsettings={'Rotors': 'Beta Gamma I II III IV V',
-                   'Reflector': 'A B C D',
-                   'Rings': '',
-                   'Positions': '',
-                   'Plugboard': ''}
-
-newbombe=Bombe('DMEXBMKYCVPNQBEDHXVPZGKMTFFBJRPJTLHLCHOTKOYXGGHZ','SECRETS',knownsettings,permittedsettings)
-#print(newbombe.solve())
-
-
-#Code 2
-
-knownsettings={'Rotors': 'Beta I III',
-                   'Reflector': 'B',
-                   'Rings': '23 02 10',
-                   'Positions': 'x x x',
-                   'Plugboard': 'VH PT ZG BJ EY FS'}
-
-permittedsettings={'Rotors': 'Beta Gamma I II III IV V',
-                   'Reflector': 'A B C D',
-                   'Rings': '',
-                   'Positions': '',
-                   'Plugboard': ''}
+    def _core_sequence(self, machine, offsets):
+        """
+        The unsteckered rotor/reflector permutation of every keypress a crib placement covers, keyed by keypress index.
+        Computed once per rotor setting: the plugboard only acts around it, so every candidate board reuses it.
+        """
+        cores = {}
+        if not offsets:
+            return cores
+        nrotors = len(machine.positions)
+        first, sequence = self._window(machine, offsets) #shared with _check
+        for offset in offsets:
+            for i in range(offset, offset + len(self.cribindex)):
+                if i not in cores:
+                    cores[i] = machine.core_permutation(sequence[(i-first)*nrotors:(i-first+1)*nrotors])
+        return cores
 
-newbombe=Bombe('CMFSUPKNCBMUYEQVVDYKLRQZTPUFHSWWAKTUGXMPAMYAFITXIJKMH','UNIVERSITY',knownsettings,permittedsettings)
-#print(newbombe.solve())
+    def _menu_plugboards(self, machine, domains, cores):
+        """
+        Turing-style menu for the unknown plug leads.
+        For every possible crib offset the crib/ciphertext letter pairs form a menu: at keypress i, crib letter p and code letter c
+         are linked through the unsteckered rotor/reflector permutation T_i, so stecker(c) = T_i(stecker(p)) and vice versa.
+        A hypothesis for one letter's stecker is propagated around the menu and its loops; any contradiction
+         (a letter steckered twice, a known lead broken, more new leads than free slots) rejects it without decrypting.
+        Yields the plugboard candidates consistent with some offset, each one once, as tuples of option indexes per slot
+         for _check_incremental to confirm. cores holds the permutations T_i, see _core_sequence.
+        """
+        fixed = {} #letter -> partner, from the fully known leads
+        partial = {} #letter -> slot, for leads with one known end e.g. "Ax"
+        freeslots = [] #slots with both ends unknown "xx"
+        for slot, templ in enumerate(self.known_options['Plugboard']):
+            if 'x' not in templ:
+                a, b = ord(templ[0]) - ord('A'), ord(templ[1]) - ord('A')
+                fixed[a], fixed[b] = b, a
+            elif templ == 'xx':
+                freeslots.append(slot)
+            else:
+                partial[ord(templ.replace('x', '')) - ord('A')] = slot
+        permitted = None
+        if self.permitted_options['Plugboard']:
+            permitted = {frozenset((ord(p[0]) - ord('A'), ord(p[1]) - ord('A'))) for p in self.permitted_options['Plugboard']}
 
+        seen = set()
+        for offset in self._crib_offsets(machine):
+            edges = []
+            for j, letter in enumerate(self.cribindex):
+                i = offset + j
+                edges.append((letter, self.codeindex[i], cores[i]))
+            for stecker in self._menu_steckers(edges, fixed, partial, len(freeslots), permitted):
+                for combo in self._fill_plugboard(stecker, domains, fixed, partial):
+                    if combo not in seen:
+                        seen.add(combo)
+                        yield combo
 
-#Code 3
+    def _menu_steckers(self, edges, fixed, partial, nfree, permitted):
+        """
+        Depth-first search over stecker hypotheses for the menu letters, propagating each one along the menu edges.
+        Yields every complete, consistent stecker map {letter: partner} for the letters on the menu.
+        """
+        links = {} #letter -> [(other letter, permutation)]
+        for p, c, perm in edges:
+            links.setdefault(p, []).append((c, perm))
+            links.setdefault(c, []).append((p, perm))
+        #visit letters outward from the most connected one, so each hypothesis propagates as far as possible
+        order = []
+        for start in sorted(links, key=lambda x: -len(links[x])):
+            if start in order:
+                continue
+            queue = [start]
+            while queue:
+                letter = queue.pop(0)
+                if letter not in order:
+                    order.append(letter)
+                    queue.extend(other for other, perm in links[letter])
 
-knownsettings={'Rotors': 'x x x',
-                   'Reflector': 'x',
-                   'Rings': 'x x x',
-                   'Positions': 'E M Y',
-                   'Plugboard': 'FH TS BE UQ KD AL'}
+        def freecount(stecker):
+            return sum(1 for a, b in stecker.items() if a < b and a not in fixed and a not in partial and b not in partial)
 
-permittedsettings={'Rotors': 'Beta Gamma II IV',
-                   'Reflector': 'A B C D',
-                   'Rings': '00 02 04 06 08 20 22 24 26',
-                   'Positions': '',
-                   'Plugboard': ''}
+        def assign(stecker, a, b, pending):
+            """Plugs a to b if that is consistent, queuing both letters for propagation."""
+            if a in stecker or b in stecker:
+                return stecker.get(a) == b
+            if a == b:
+                if a in partial:
+                    return False #a lead with a known end is plugged somewhere else
+            else:
+                if a in partial and b in partial:
+                    return False #two half-known leads cannot share one lead
+                if a not in partial and b not in partial:
+                    if permitted is not None and frozenset((a, b)) not in permitted:
+                        return False
+                    if freecount(stecker) >= nfree:
+                        return False #no free slot left for a new lead
+            stecker[a] = b
+            stecker[b] = a
+            pending.extend((a, b))
+            return True
 
-newbombe=Bombe('ABSKJAKKMRITTNYURBJFWQGRSGNNYJSDRYLAPQWIAGKJYEPCTAGDCTHLCDRZRFZHKNRSDLNPFPEBVESHPY','THOUSANDS',knownsettings,permittedsettings)
-#code3=newbombe.solve()
+        def propagate(stecker, pending):
+            while pending:
+                letter = pending.pop()
+                for other, perm in links.get(letter, ()):
+                    if not assign(stecker, other, perm[stecker[letter]], pending):
+                        return False
+            return True
 
-#Code 4
+        def search(stecker):
+            for letter in order:
+                if letter not in stecker:
+                    break
+            else:
+                yield stecker
+                return
+            for partner in range(26):
+                trial = dict(stecker)
+                pending = []
+                if assign(trial, letter, partner, pending) and propagate(trial, pending):
+                    yield from search(trial)
 
-knownsettings={'Rotors': 'V III IV',
-                   'Reflector': 'A',
-                   'Rings': '24 12 10',
-                   'Positions': 'S W U',
-                   'Plugboard': 'WP RJ Ax VF Ix HN CG BS'}
+        stecker = dict(fixed)
+        pending = list(fixed)
+        if propagate(stecker, pending):
+            yield from search(stecker)
 
-permittedsettings={'Rotors': 'Beta Gamma I II III IV V',
-                   'Reflector': 'A B C D',
-                   'Rings': '',
-                   'Positions': '',
-                   'Plugboard': ''}
+    def _fill_plugboard(self, stecker, domains, fixed, partial):
+        """
+        Turns a stecker map from the menu into plugboard candidates: slots it determines get that lead,
+         the rest keep the options from their domain that do not touch a letter the menu already placed.
+        Yields tuples of option indexes, one per slot.
+        """
+        newleads = sorted((a, b) for a, b in stecker.items() if a < b and a not in fixed and a not in partial and b not in partial)
+        slotdomains = []
+        for slot, domain in enumerate(domains):
+            templ = self.known_options['Plugboard'][slot]
+            if 'x' not in templ:
+                slotdomains.append([0])
+            elif templ == 'xx':
+                if newleads:
+                    lead = set(newleads.pop(0))
+                    slotdomains.append([option for option, pair in enumerate(domain) if set(pair) == lead])
+                else:
+                    slotdomains.append([option for option, pair in enumerate(domain)
+                                        if not any(x in stecker or x in partial for x in pair)])
+            else:
+                known = ord(templ.replace('x', '')) - ord('A')
+                if known in stecker:
+                    slotdomains.append([option for option, pair in enumerate(domain) if stecker[known] in pair])
+                else:
+                    slotdomains.append([option for option, pair in enumerate(domain)
+                                        if not any(x != known and (x in stecker or x in partial) for x in pair)])
+        for combo in itertools.product(*slotdomains):
+            used = [x for slot, option in enumerate(combo) for x in domains[slot][option]]
+            if len(set(used)) == len(used): #every letter on at most one lead
+                yield combo
 
-newbombe=Bombe('SDNTVTPHRBNWTLMZTQKZGADDQYPFNHBPNHCQGBGMZPZLUAVGDQVYRBFYYEIXQWVTHXGNW','MAKINGOFTHESEEXAMPLES',knownsettings,permittedsettings)
-#print(newbombe.solve())
 
-#Code 5
+    # Solution
+    def _crib_offsets(self, enigma):
+        """
+        Offsets where the crib can sit for this machine.
+        """
+        if any(enigma.reflectormap[i] == i for i in range(26)):
+            return self.alloffsets #a reflector with a fixed point can encode a letter to itself
+        return self.criboffsets
 
-knownsettings={'Rotors': 'V II IV',
-                   'Reflector': 'D',
-                   'Rings': '06 18 07',
-                   'Positions': 'A J L',
-                   'Plugboard': 'UG IE PO NX WT'}
+    def _check_incremental(self, cores, offsets, plugmap, touched, witnesses):
+        """
+        _check for one of many plugboard candidates at the same rotor setting.
+        cores holds the unsteckered permutation of each keypress the menu looked at, so crib letter j fits at offset o
+         when cores[i][plugmap[c]] == plugmap[p] for i = o+j, ciphertext letter c and crib letter p: a test on two steckers.
+        witnesses keeps, per offset, the crib index where the previous candidate failed. While neither of its two letters
+         is in touched (the letters whose stecker changed since), the offset still fails and is not looked at again;
+         otherwise it is scanned afresh and gets a new witness.
+        Returns True if the whole crib fits at some offset.
+        """
+        codeindex, cribindex = self.codeindex, self.cribindex
+        for offset in offsets:
+            j = witnesses.get(offset)
+            if j is not None and codeindex[offset+j] not in touched and cribindex[j] not in touched:
+                continue
+            for j, letter in enumerate(cribindex):
+                i = offset + j
+                if cores[i][plugmap[codeindex[i]]] != plugmap[letter]:
+                    witnesses[offset] = j
+                    break
+            else: #the whole crib fits at this offset
+                return True
+        return False
 
-permittedsettings={'Rotors': 'Beta Gamma I II III IV V',
-                   'Reflector': 'A B C D',
-                   'Rings': '',
-                   'Positions': '',
-                   'Plugboard': ''}
+    def _window(self, machine, offsets):
+        """
+        Rotor positions for the keypresses from the first to the last crib placement, as (first keypress, sequence):
+         the positions for keypress i are sequence[(i-first)*n:(i-first+1)*n] for n rotors.
+        The rotors jump straight to the first placement with positions_at rather than stepping through the message before it.
+        Windows up to STEPPING_CACHE_MAX_LENGTH keypresses come from the shared stepping sequence cache, so a branch is
+         stepped once for all its candidates; longer ones are stepped without caching them.
+        """
+        first = min(offsets)
+        length = max(offsets) + len(self.cribindex) - first
+        start = tuple(machine.positions_at(first))
+        if length <= STEPPING_CACHE_MAX_LENGTH:
+            return first, stepping_sequence(start, tuple(machine.notches), length)
+        return first, stepping_sequence.__wrapped__(start, tuple(machine.notches), length)
 
-newbombe=Bombe('HWREISXLGTTBYVXRCWWJAKZDTVZWKBDJPVQYNEQIOTIFX','INSTAGRAM',knownsettings,permittedsettings)
-#print(newbombe.solve())
+    def _check(self, machine, plugmap):
+        """
+        Tries the crib at each possible offset, decoding only the letters it needs and abandoning an offset at the first mismatch.
+        machine is the compiled branch at the candidate's positions, and plugmap the candidate's plugboard table.
+        Only the window of keypresses the placements cover is stepped, see _window; decoded letters are shared between
+         overlapping placements.
+        Returns True if the whole crib fits at some offset.
+        """
+        offsets = self._crib_offsets(machine)
+        if not offsets:
+            return False
+        nrotors = len(machine.positions)
+        first, sequence = self._window(machine, offsets)
+        plain = [None] * len(self.code) #decoded letter indices, filled in only where a placement needs them
+        forwardrows, backwardrows, reflectormap = machine.forwardrows, machine.backwardrows, machine.reflectormap
+        for offset in offsets:
+            for j, letter in enumerate(self.cribindex):
+                i = offset + j
+                decoded = plain[i]
+                if decoded is None:
+                    base = (i - first) * nrotors #positions for keypress i
+                    decoded = plugmap[self.codeindex[i]]
+                    for k in range(nrotors-1, -1, -1):
+                        decoded = forwardrows[k][sequence[base+k]][decoded] #wheel k's conjugate at its position
+                    decoded = reflectormap[decoded]
+                    for k in range(nrotors):
+                        decoded = backwardrows[k][sequence[base+k]][decoded]
+                    decoded = plugmap[decoded]
+                    plain[i] = decoded
+                if decoded != letter:
+                    break
+            else: #the whole crib fits at this offset
+                return True
+        return False
@@ -2,109 +2,467 @@ from enigma.Plugboard import Plugboard
 from enigma.Settings import Settings
 from enigma.Rotor import Rotor
 from enigma.Reflector import Reflector
+from enigma.Stream import EnigmaStream
+from collections import OrderedDict
+import functools
+import itertools
+import re
+import time
+
+#Upper bound on the number of position states kept in the shared state table cache
+STATE_TABLE_CACHE_SIZE = 1 << 16
+
+#Upper bounds on the number of stepping sequences kept in the shared cache, and on the keypresses of a cached sequence
+STEPPING_CACHE_SIZE = 4096
+STEPPING_CACHE_MAX_LENGTH = 4096
+
+#Every byte that is not A-Z, for counting the keypresses in a buffer
+NONLETTERS = bytes(b for b in range(256) if not 65 <= b <= 90)
+
+#The identity permutation of the 26 letter indices, the start of every composition
+IDENTITY = bytes(range(26))
+
+#Bulk byte path: the stepping period it accepts, how many keypresses per state it needs before it beats the letter loop
+# when the translate tables of the start positions are already built (2) and when they have to be built first (16;
+# measured at about 20 ms of table building against about 2 us a letter in the loop, for a period of 676),
+# and how many start positions each machine keeps translate tables for
+BULK_MAX_PERIOD = 26 ** 3
+BULK_MIN_REPEATS = 2
+BULK_COLD_REPEATS = 16
+BULK_CACHE_SIZE = 16
+
+#Policies for bytes other than A-Z in encode_bytes
+NONLETTER_POLICIES = ('pass', 'strip', 'error')
 
 class Enigma:
 
-    def __init__(self, inputsettings):
+    #Shared LRU of core permutations keyed by (corekey, positions), reused by every machine with the same wheels
+    statetablecache = OrderedDict()
+
+    def __init__(self, inputsettings, statetables=None, metrics=None):
         self.inputsettings = inputsettings
         """
         Enigma objects are instantiated with a dictionary of settings for all elements of the machine.
         The enigma_encode method is called with a string containing the cypher text to be encoded/ decoded.
-        The method processes the Enigma object settings with a Settings object and instantiates 
-         rotor, reflector and plugboard objects that have encoding methods.
-        It then processes the input string and starts encoding letter by letter until it reaches the end of the string.
-        It calls the encode functions arranged in the correct order and passes the result to the next one.
+        The settings are processed once, here, with a Settings object that instantiates 
+         rotor, reflector and plugboard objects, and the machine is compiled into integer lookup tables.
+        Use Enigma.from_resolved() to skip the Settings step when the settings are already resolved.
+        enigma_encode then processes the input string and starts encoding letter by letter until it reaches the end of the string.
+        It looks the letter up in the tables in the correct order and passes the result to the next one.
         It also calls step_rotors() method to simulated the movements of the rotors considering the current positions and mapped notches.
         Finally, it appends the character to an output string and returns the encoded/ decoded text.
+        statetables optionally switches to one table lookup per letter, using the permutation of the position state:
+         - None:  walk the rotor stack for every letter
+         - 'lru': memoize the permutation of each position state in a bounded LRU shared between machines
+         - 'all': precompute the permutation of every position state step_rotors can reach
+        metrics optionally takes an enigma.Metrics object, which then times settings parsing ('enigma.settings'),
+         table construction ('enigma.tables'), stepping ('enigma.stepping') and encoding ('enigma.encode')
+         and counts the letters encoded ('enigma.letters').
+        """
+        self.metrics = metrics
+        if metrics is not None:
+            start = time.perf_counter()
+
+        #Settings input
+        newsettings = Settings(self.inputsettings)
+        rotors, reflector, plugleads = newsettings.get_rotors(), newsettings.get_reflector(), newsettings.get_plugboard_mapping()
+        if metrics is not None:
+            metrics.add_time('enigma.settings', time.perf_counter() - start)
+
+        #Settings processing
+        self.setup(rotors, reflector, plugleads, statetables)
+
+    @classmethod
+    def from_resolved(cls, rotors, reflector, plugleads, statetables=None, metrics=None):
+        """
+        Builds an Enigma from settings that are already resolved against the wiring catalogue,
+        i.e. the outputs of Settings.get_rotors(), get_reflector() and get_plugboard_mapping().
+        Nothing is read from disk, so this is the constructor to use in hot loops.
+        """
+        enigma = cls.__new__(cls)
+        enigma.inputsettings = None
+        enigma.metrics = metrics
+        enigma.setup(rotors, reflector, plugleads, statetables)
+        return enigma
+
+    def setup(self, newrotors, newreflector, newplugleads, statetables):
+        """
+        Shared by both constructors: compiles the machine and, if asked for, its state tables.
         """
+        if statetables not in (None, 'lru', 'all'):
+            raise ValueError(f"Unknown state table mode: {statetables}")
+        self.statetables = statetables
+        if self.metrics is not None:
+            start = time.perf_counter()
+        self.compile(newrotors, newreflector, newplugleads)
+        if statetables == 'all':
+            self.precompute_state_tables()
+        if self.metrics is not None:
+            self.metrics.add_time('enigma.tables', time.perf_counter() - start)
 
+    def compile(self, newrotors, newreflector, newplugleads):
+        """
+        Use resolved settings to create plugboard, rotors and reflector instances and collect their compiled tables:
+        the forward and backward conjugate rows per rotor, the reflector map and the plugboard permutation.
+        """
+         ##Plugboard
+        self.plugboard=Plugboard(newplugleads) # plugboard object, newplugleads is a list where each element is a plug lead pair
+
+         ##Rotors
+        self.rotors=[]
+        self.positions=[]
+        self.notches=[]
+        # newrotors is a list where each rotor element is a dictionary with attributes wiring, notches, position
+
+        for i in range(len(newrotors)):
+                self.rotors.append(Rotor(newrotors[i])) # generate a list of rotor objects
+                self.positions.append(ord(newrotors[i]['position'])-ord('A'))
+                if newrotors[i]['notch']:
+                   self.notches.append(ord(newrotors[i]['notch'])-ord('A'))
+                else:
+                    self.notches.append(None)
 
-    def step_rotors(self, positions, notches):
+         ##Reflector
+        self.reflector=Reflector(newreflector)
+
+         ##Lookup tables
+        self.forwardrows=[rotor.forwardrows for rotor in self.rotors] #forwardrows[j][position] is wheel j's whole permutation
+        self.backwardrows=[rotor.backwardrows for rotor in self.rotors]
+        self.reflectormap=self.reflector.map
+        self.plugmap=self.plugboard.table
+
+         ##Key of the rotor/reflector core, the plugboard is applied around the state tables
+        self.corekey='|'.join([f"{rotor.wiring}:{rotor.ring}" for rotor in self.rotors]+[self.reflector.wiring])
+        self.statetablemap={}
+        self.bulktables=OrderedDict() #start positions -> translate tables of encode_bytes, one per state of the period
+
+    def core_permutation(self, positions):
+        """
+        The permutation of the rotors, the reflector and back for one position state, without the plugboard.
+        Built by composing the wheels' conjugate rows for the state, a whole alphabet per step, rather than letter by letter.
+        Returns the 26-letter permutation as bytes of letter indices.
+        """
+        table=IDENTITY
+        for j in range(len(positions)-1,-1,-1):
+            table=bytes(map(self.forwardrows[j][positions[j]].__getitem__, table))
+        table=bytes(map(self.reflectormap.__getitem__, table))
+        for j in range(len(positions)):
+            table=bytes(map(self.backwardrows[j][positions[j]].__getitem__, table))
+        return table
+
+    def state_table(self, positions):
+        """
+        Returns the core permutation for a position state, from the precomputed map or from the shared LRU.
+        """
+        key=tuple(positions)
+        table=self.statetablemap.get(key)
+        if table is not None:
+            return table
+        cache=Enigma.statetablecache
+        cachekey=(self.corekey, key)
+        table=cache.get(cachekey)
+        if table is None:
+            table=self.core_permutation(key)
+            cache[cachekey]=table
+            if len(cache) > STATE_TABLE_CACHE_SIZE:
+                cache.popitem(last=False) #evict the least recently used state
+        else:
+            cache.move_to_end(cachekey)
+        return table
+
+    def precompute_state_tables(self):
+        """
+        Build the core permutation of every position state reachable from the start positions.
+        The leftmost wheel never steps, so that is 26^(n-1) states.
+        """
+        ranges=[[self.positions[0]]]+[range(26)]*(len(self.positions)-1)
+        self.statetablemap={state: self.core_permutation(state) for state in itertools.product(*ranges)}
+
+
+    @staticmethod
+    def step_rotors(positions, notches):
         """
         Advance the rightmost wheel every keypress, and then
         cascade any notch‐triggered turnovers to the left.
         positions and notches are parallel lists of length number of rotors.
         """
         n = len(positions)
-        pos_on_notch = [False]*n # assume no positions are on the notch
-        pos_on_notch[-1] = True  # rightmost always steps
 
-        #Any wheel whose right neighbor is at its notch also steps
-        for i in range(n-2, 0, -1):
+        #Any wheel whose right neighbor is at its notch also steps.
+        #Going left to right, the neighbour on the right has not been advanced yet when it is checked, so no flags are needed
+        for i in range(1, n-1):
             if notches[i+1] is not None and positions[i+1] == notches[i+1]:
-                pos_on_notch[i] = True # flag where a turnover is needed
-
-        #Advance flagged positions
-        for i in range(n):
-            if pos_on_notch[i]:
                 positions[i] = (positions[i] + 1) % 26
 
-    def enigma_encode(self, cyphertext):
+        #The rightmost always steps
+        positions[-1] = (positions[-1] + 1) % 26
+
+    def positions_at(self, keypresses):
         """
-        Input settings and strings to be encoded/ decoded.
-        Use settings to create plugboard, rotors and reflector instances.
-        For each letter in the input string encode forward and backward through the sequence of objects and generate output string.
+        Rotor positions after the given number of keypresses from the start positions, in closed form.
+        step_rotors moves the rightmost wheel every keypress, the next wheel whenever the rightmost is on its notch
+         and the one after that on every keypress where the second wheel sits on its notch; the leftmost never moves.
+        Counting those keypresses is arithmetic for machines of up to four rotors; longer stacks fall back to stepping.
         """
-        #Settings input
-        newsettings = Settings(self.inputsettings)
+        positions=list(self.positions)
+        notches=self.notches
+        n=len(positions)
+        if n > 4:
+            for i in range(keypresses):
+                self.step_rotors(positions, notches)
+            return positions
+        if keypresses <= 0:
+            return positions
 
-        #Settings processing
+        ##Rightmost wheel: one step per keypress
+        right=positions[-1]
+        positions[-1]=(right+keypresses) % 26
+        if n < 3:
+            return positions
 
-         ##Plugboard
-        newplugleads=newsettings.get_plugboard_mapping() # a list where each element is a plug lead pair
-        newplugboard=Plugboard(newplugleads) # plugboard object
+        ##Second wheel from the right: one step per keypress starting on the rightmost notch, i.e. every 26 from the first
+        if notches[-1] is None:
+            first=None
+            secondsteps=0
+        else:
+            first=(notches[-1]-right) % 26 #keypresses before the rightmost first sits on its notch
+            secondsteps=0 if keypresses <= first else (keypresses-1-first)//26+1
+        second=positions[-2]
+        positions[-2]=(second+secondsteps) % 26
+        if n < 4:
+            return positions
 
-         ##Rotors
-        rotors=[]
-        positions=[]
-        notches=[]
-        newrotors = newsettings.get_rotors() # a dictionary where each rotor element has attributes wiring, notches, position
-
-        for i in range(len(newrotors)):
-                rotors.append(Rotor(newrotors[i])) # generate a list of rotor objects
-                positions.append(ord(newrotors[i]['position'])-ord('A'))
-                if newrotors[i]['notch']:
-                   notches.append(ord(newrotors[i]['notch'])-ord('A'))
+        ##Third wheel from the right: one step per keypress that starts with the second wheel on its notch
+        if notches[-2] is None:
+            thirdsteps=0
+        else:
+            target=(notches[-2]-second) % 26 #steps the second wheel needs before it sits on its notch
+            if first is None:
+                thirdsteps=keypresses if target == 0 else 0 #the second wheel never moves
+            else:
+                #the second wheel has taken c steps for c == 0 during the first first+1 keypresses, then for 26 keypresses per c
+                def start(c):
+                    return 0 if c == 0 else first+1+26*(c-1)
+                last=0 if keypresses-1 <= first else (keypresses-2-first)//26+1 #steps taken before the last keypress
+                if last < target:
+                    thirdsteps=0
                 else:
-                    notches.append(None)
+                    count=(last-target)//26+1 #how many times the second wheel has come round to its notch
+                    thirdsteps=26*count
+                    if target == 0:
+                        thirdsteps+=first+1-26
+                    lastc=target+26*(count-1)
+                    if lastc == last: #the current stay on the notch is still going on
+                        full=first+1 if lastc == 0 else 26
+                        thirdsteps+=keypresses-start(lastc)-full
+        positions[-3]=(positions[-3]+thirdsteps) % 26
+        return positions
 
-         ##Reflector
-        reflector=Reflector(newsettings.get_reflector())
+    def enigma_encode(self, cyphertext, offset=0):
+        """
+        Input strings to be encoded/ decoded.
+        For each letter in the input string look it up forward and backward through the compiled tables and generate output string.
+        Every call starts from the positions in the settings. Characters other than A-Z are passed through without a keypress.
+        With offset=k the input is taken as the slice of a message starting at its k-th letter:
+         the rotors jump straight to the state after k keypresses instead of stepping there.
+        """
+        inputbytes=cyphertext.encode('ascii')
+        if len(inputbytes) >= BULK_MIN_REPEATS*26*26: #long enough for the bulk translate path to pay off
+            return self.encode_bytes(inputbytes, upper=False, positions=self.positions_at(offset)).decode('ascii')
+        outputbytes=bytearray(len(inputbytes)) #preallocated output, filled in place
+        self.encode_buffer(inputbytes, outputbytes, self.positions_at(offset))
+        return outputbytes.decode('ascii')
 
-        #Input code
-        inputstr=cyphertext
-        outputstr=''
-        encodedchar=0
+    def stream(self, positions=None):
+        """
+        A stateful streaming encoder that keeps the rotor positions between chunks, see enigma.Stream.
+        """
+        return EnigmaStream(self, positions)
+
+    def encode_buffer(self, inputbytes, outputbytes, positions, cache=True):
+        """
+        Encodes a buffer of ASCII codes into a preallocated bytearray of the same length.
+        positions is the rotor state before the first keypress and is advanced in place, so a caller can carry it over
+         to the next buffer. Bytes other than A-Z are copied unchanged and do not step the rotors.
+        The rotor states come from stepping_sequence, shared between machines through its cache unless cache=False.
+        """
+        forwardrows=self.forwardrows
+        backwardrows=self.backwardrows
+        reflectormap=self.reflectormap
+        plugmap=self.plugmap
+        nrotors=len(positions)
+        metrics=self.metrics
+        if metrics is not None:
+            start=time.perf_counter()
+        keypresses=len(bytes(inputbytes).translate(None, NONLETTERS))
+        if cache and keypresses <= STEPPING_CACHE_MAX_LENGTH:
+            sequence=stepping_sequence(tuple(positions), tuple(self.notches), keypresses)
+        else:
+            sequence=stepping_sequence.__wrapped__(tuple(positions), tuple(self.notches), keypresses)
+        base=0 #offset of the current keypress in the sequence
+        if metrics is not None:
+            stepped=time.perf_counter()
+            metrics.add_time('enigma.stepping', stepped-start)
 
-        #Encoding - loop over the string for each character
-        for i in range(len(inputstr)):
-            inputchar=inputstr[i]
+        #Encoding with state tables - one lookup per letter between the two plugboard passes
+        if self.statetables is not None:
+            for i, inputbyte in enumerate(inputbytes):
+                if not 65 <= inputbyte <= 90:
+                    outputbytes[i]=inputbyte
+                    continue
+                table=self.state_table(sequence[base:base+nrotors])
+                outputbytes[i]=plugmap[table[plugmap[inputbyte-65]]]+65
+                base+=nrotors
 
-            ##Plugboard encoding and transforming to an index to lookup the mappings in the next steps
-            encodedchar=ord(newplugboard.encode(inputchar))-ord('A')
+        #Encoding - loop over the buffer for each character
+        else:
+            for i, inputbyte in enumerate(inputbytes):
+                if not 65 <= inputbyte <= 90: #ord('A') to ord('Z')
+                    outputbytes[i]=inputbyte
+                    continue
 
-            ##Rotor positions setup
+                ##Plugboard encoding and transforming to an index to lookup the mappings in the next steps
+                encodedchar=plugmap[inputbyte-65]
 
-            self.step_rotors(positions, notches)
+                ##Encode forward through the rotors, at the positions for this keypress: one read per wheel
+                for j in range(nrotors-1,-1,-1):
+                    encodedchar=forwardrows[j][sequence[base+j]][encodedchar]
 
-            ##Encode forward through the rotors
-            for j in range(len(rotors)-1,-1,-1):
-                encodedchar=rotors[j].encodeforward(encodedchar,positions[j])
+                ##Reflector
+                encodedchar=reflectormap[encodedchar]
 
-            ##Reflector
-            encodedchar =reflector.encoderefl(encodedchar)
+                ##Encode backward through the rotors
+                for j in range(nrotors):
+                    encodedchar=backwardrows[j][sequence[base+j]][encodedchar]
+
+                ##Final pass through the plugboard and back to an ASCII code
+                outputbytes[i]=plugmap[encodedchar]+65
+                base+=nrotors
+
+        if keypresses:
+            positions[:]=sequence[base-nrotors:base] #the state after the last keypress
+        if metrics is not None:
+            metrics.add_time('enigma.encode', time.perf_counter()-stepped)
+            metrics.count('enigma.letters', keypresses)
+        return outputbytes
+
+    def encode_bytes(self, data, nonletters='pass', upper=True, positions=None):
+        """
+        Bytes-in/ bytes-out encoding of a whole buffer (bytes, bytearray, memoryview or mmap), returning a bytearray.
+        With upper=True lowercase letters are upper-cased first; nonletters is the policy for every other byte:
+         'pass' copies it to the output without a keypress as enigma_encode does, 'strip' drops it and 'error' raises ValueError.
+        positions is the rotor state before the first keypress and is advanced in place as in encode_buffer;
+         by default the machine's start positions are used and left alone.
+        The stepping is periodic (the leftmost wheel never moves), so keypress i is in the same state as keypress i+P.
+        Once every state of the period comes round often enough, each state's plugboard-core-plugboard permutation
+         is applied to its letters buf[r::P] in one bytes.translate call; shorter buffers go through encode_buffer.
+        Often enough is BULK_MIN_REPEATS keypresses per state when the tables for these start positions are cached,
+         BULK_COLD_REPEATS when they still have to be built.
+        """
+        if nonletters not in NONLETTER_POLICIES:
+            raise ValueError(f"nonletters must be one of {NONLETTER_POLICIES}, not {nonletters!r}")
+        if positions is None:
+            positions=list(self.positions)
+        view=memoryview(data).cast('B')
+        text=bytes(view).upper() if upper else view #the one bulk copy, when the case is normalised
+        letters=bytes(text).translate(None, NONLETTERS)
+        mixed=len(letters) != len(view)
+        if mixed and nonletters == 'error':
+            raise ValueError(f"Input contains {len(view)-len(letters)} bytes other than A-Z")
+        encoded=self._encode_letters(letters, positions)
+        if not mixed or nonletters == 'strip':
+            return encoded
+
+        ##Pass through: copy the input and drop the encoded runs of letters back in place
+        output=bytearray(text)
+        base=0
+        for run in re.finditer(rb'[A-Z]+', output):
+            start, end=run.span()
+            output[start:end]=encoded[base:base+end-start]
+            base+=end-start
+        return output
+
+    def bulk_tables(self, start, sequence, period):
+        """
+        The 256-byte translate table of each keypress state in one period from start, composed with the plugboard.
+        Kept per machine for the last BULK_CACHE_SIZE start positions, since a file of messages under one key
+         starts every message from the same positions.
+        """
+        cache=self.bulktables
+        tables=cache.get(start)
+        if tables is not None:
+            cache.move_to_end(start)
+            return tables
+        nrotors=len(start)
+        plugmap=self.plugmap
+        tables=[]
+        for r in range(period):
+            core=self.state_table(sequence[r*nrotors:(r+1)*nrotors])
+            table=bytearray(range(256))
+            table[65:91]=bytes(plugmap[core[plugmap[x]]]+65 for x in range(26))
+            tables.append(bytes(table))
+        cache[start]=tables
+        if len(cache) > BULK_CACHE_SIZE:
+            cache.popitem(last=False)
+        return tables
+
+    def _encode_letters(self, letters, positions):
+        """
+        Encodes a bytes object of A-Z only for encode_bytes, advancing positions in place.
+        """
+        length=len(letters)
+        period=stepping_period(tuple(positions), tuple(self.notches))
+        repeats=BULK_MIN_REPEATS if tuple(positions) in self.bulktables else BULK_COLD_REPEATS
+        if period is None or length < repeats*period:
+            return self.encode_buffer(letters, bytearray(length), positions, cache=False)
+        metrics=self.metrics
+        if metrics is not None:
+            start=time.perf_counter()
+        nrotors=len(positions)
+        sequence=stepping_sequence(tuple(positions), tuple(self.notches), period)
+        tables=self.bulk_tables(tuple(positions), sequence, period)
+        output=bytearray(length)
+        for r in range(period):
+            output[r::period]=letters[r::period].translate(tables[r])
+        last=(length-1) % period
+        positions[:]=sequence[last*nrotors:(last+1)*nrotors]
+        if metrics is not None:
+            metrics.add_time('enigma.encode', time.perf_counter()-start)
+            metrics.count('enigma.letters', length)
+        return output
 
-            ##Encode backward through the rotors
-            for j in range(len(rotors)):
-                encodedchar = rotors[j].encodebackward(encodedchar, positions[j])
 
-            ##Convert back to character and final pass through the plugboard
-            encodedchar= chr(encodedchar + ord('A'))
-            outputchar = newplugboard.encode(encodedchar)
+@functools.lru_cache(maxsize=STEPPING_CACHE_SIZE)
+def stepping_sequence(positions, notches, length):
+    """
+    Rotor positions for each of length keypresses from the start positions, as step_rotors produces them.
+    Returned as compact bytes: the positions for keypress i are sequence[i*n:(i+1)*n] for n rotors.
+    Cached per (positions, notches, length) and shared by every machine, since rings, wiring and plugboard
+     do not affect stepping: the Bombe steps each branch once however many candidates it checks there.
+    """
+    positions=list(positions)
+    n=len(positions)
+    sequence=bytearray(n*length)
+    for i in range(0, n*length, n):
+        Enigma.step_rotors(positions, notches)
+        sequence[i:i+n]=bytes(positions)
+    return bytes(sequence)
 
-            outputstr += outputchar
 
-        return outputstr
+@functools.lru_cache(maxsize=STEPPING_CACHE_SIZE)
+def stepping_period(positions, notches):
+    """
+    Number of keypresses after which the rotors are back at positions, or None beyond BULK_MAX_PERIOD.
+    Stepping is a permutation of the position states, so the sequence from any start is purely periodic:
+     26 keypresses when the rightmost wheel has no notch, 676 for a three wheel machine that turns over.
+    """
+    start=list(positions)
+    current=list(positions)
+    for period in range(1, BULK_MAX_PERIOD+1):
+        Enigma.step_rotors(current, notches)
+        if current == start:
+            return period
+    return None
 
 
 
@@ -0,0 +1,101 @@
+from enigma.Bombe import Bombe
+import sys
+
+#Decoding exercises
+#Each one is recorded in EXAMPLES as (name, code, crib, knownsettings, permittedsettings), e.g. for enigma.Benchmark.
+#They live here rather than in Bombe.py so that importing the Bombe builds nothing.
+EXAMPLES = []
+
+
+#Code 1
+
+knownsettings={'Rotors': 'Beta Gamma V',
+                   'Reflector': 'x',
+                   'Rings': '04 02 14',
+                   'Positions': 'M J M',
+                   'Plugboard': 'KI XN FL'}
+
+permittedsettings={'Rotors': 'Beta Gamma I II III IV V',
+                   'Reflector': 'A B C D',
+                   'Rings': '',
+                   'Positions': '',
+                   'Plugboard': ''}
+
+EXAMPLES.append(('Code 1', 'DMEXBMKYCVPNQBEDHXVPZGKMTFFBJRPJTLHLCHOTKOYXGGHZ', 'SECRETS', knownsettings, permittedsettings))
+
+
+#Code 2
+
+knownsettings={'Rotors': 'Beta I III',
+                   'Reflector': 'B',
+                   'Rings': '23 02 10',
+                   'Positions': 'x x x',
+                   'Plugboard': 'VH PT ZG BJ EY FS'}
+
+permittedsettings={'Rotors': 'Beta Gamma I II III IV V',
+                   'Reflector': 'A B C D',
+                   'Rings': '',
+                   'Positions': '',
+                   'Plugboard': ''}
+
+EXAMPLES.append(('Code 2', 'CMFSUPKNCBMUYEQVVDYKLRQZTPUFHSWWAKTUGXMPAMYAFITXIJKMH', 'UNIVERSITY', knownsettings, permittedsettings))
+
+
+#Code 3
+
+knownsettings={'Rotors': 'x x x',
+                   'Reflector': 'x',
+                   'Rings': 'x x x',
+                   'Positions': 'E M Y',
+                   'Plugboard': 'FH TS BE UQ KD AL'}
+
+permittedsettings={'Rotors': 'Beta Gamma II IV',
+                   'Reflector': 'A B C D',
+                   'Rings': '00 02 04 06 08 20 22 24 26',
+                   'Positions': '',
+                   'Plugboard': ''}
+
+EXAMPLES.append(('Code 3', 'ABSKJAKKMRITTNYURBJFWQGRSGNNYJSDRYLAPQWIAGKJYEPCTAGDCTHLCDRZRFZHKNRSDLNPFPEBVESHPY', 'THOUSANDS', knownsettings, permittedsettings))
+
+#Code 4
+
+knownsettings={'Rotors': 'V III IV',
+                   'Reflector': 'A',
+                   'Rings': '24 12 10',
+                   'Positions': 'S W U',
+                   'Plugboard': 'WP RJ Ax VF Ix HN CG BS'}
+
+permittedsettings={'Rotors': 'Beta Gamma I II III IV V',
+                   'Reflector': 'A B C D',
+                   'Rings': '',
+                   'Positions': '',
+                   'Plugboard': ''}
+
+EXAMPLES.append(('Code 4', 'SDNTVTPHRBNWTLMZTQKZGADDQYPFNHBPNHCQGBGMZPZLUAVGDQVYRBFYYEIXQWVTHXGNW', 'MAKINGOFTHESEEXAMPLES', knownsettings, permittedsettings))
+
+#Code 5
+
+knownsettings={'Rotors': 'V II IV',
+                   'Reflector': 'D',
+                   'Rings': '06 18 07',
+                   'Positions': 'A J L',
+                   'Plugboard': 'UG IE PO NX WT'}
+
+permittedsettings={'Rotors': 'Beta Gamma I II III IV V',
+                   'Reflector': 'A B C D',
+                   'Rings': '',
+                   'Positions': '',
+                   'Plugboard': ''}
+
+EXAMPLES.append(('Code 5', 'HWREISXLGTTBYVXRCWWJAKZDTVZWKBDJPVQYNEQIOTIFX', 'INSTAGRAM', knownsettings, permittedsettings))
+
+
+if __name__ == "__main__":
+    """
+    python -m enigma.Examples "Code 1" "Code 2"   solves the named exercises, all five if none are named
+    """
+    names = sys.argv[1:] or [name for name, *_ in EXAMPLES]
+    for name, code, crib, knownsettings, permittedsettings in EXAMPLES:
+        if name in names:
+            newbombe = Bombe(code, crib, knownsettings, permittedsettings)
+            print(name, newbombe.solve())
@@ -0,0 +1,127 @@
+import bisect
+import json
+import time
+
+#Upper bounds in seconds of the latency histogram buckets, 1 microsecond doubling up to about 1 second, then +Inf
+HISTOGRAM_BUCKETS = [1e-6 * 2 ** k for k in range(21)] + [float('inf')]
+
+
+class Metrics:
+    """
+    Counters, timers and latency histograms for instrumenting Enigma and Bombe runs.
+    Pass one in as metrics= to either class; with the default metrics=None the hot paths skip all instrumentation
+     after a single None check, so nothing is measured or allocated.
+    Names are dotted, e.g. 'enigma.encode' or 'bombe.positions.tried'.
+    The collected numbers can be read with snapshot(), written out as JSON with dump() or scraped in the Prometheus
+     text format with prometheus(). An optional callback(kind, name, value) sees every event as it happens,
+     with kind 'count', 'time' or 'observe', e.g. to forward it to another monitoring system.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.counters = {} #name -> count
+        self.timers = {} #name -> [calls, total seconds]
+        self.histograms = {} #name -> count per bucket of HISTOGRAM_BUCKETS
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+        if self.callback is not None:
+            self.callback('count', name, n)
+
+    def add_time(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0, 0.0]
+        timer[0] += 1
+        timer[1] += seconds
+        if self.callback is not None:
+            self.callback('time', name, seconds)
+
+    def observe(self, name, seconds):
+        """
+        Records one latency in the histogram called name, and in the timer of the same name.
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = [0] * len(HISTOGRAM_BUCKETS)
+        histogram[bisect.bisect_left(HISTOGRAM_BUCKETS, seconds)] += 1
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0, 0.0]
+        timer[0] += 1
+        timer[1] += seconds
+        if self.callback is not None:
+            self.callback('observe', name, seconds)
+
+    def timed(self, name, iterable):
+        """
+        Wraps an iterator, adding the time spent producing each item to the timer called name,
+         e.g. to tell the cost of a generator apart from the work done on what it yields.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start)
+                return
+            self.add_time(name, time.perf_counter() - start)
+            yield item
+
+    def snapshot(self):
+        """
+        Plain dictionary of everything collected so far. Every counter pair 'x.tried' and 'x.pruned' also gives
+         a pruning rate 'x' under 'rates', the fraction of tried options that were pruned.
+        """
+        rates = {}
+        for name, tried in self.counters.items():
+            if name.endswith('.tried') and tried:
+                stage = name[:-len('.tried')]
+                rates[stage] = self.counters.get(stage + '.pruned', 0) / tried
+        return {'counters': dict(self.counters),
+                'timers': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.timers.items()},
+                'histograms': {name: {'buckets': [str(bound) for bound in HISTOGRAM_BUCKETS], 'counts': list(counts)}
+                               for name, counts in self.histograms.items()},
+                'rates': rates}
+
+    def dump(self, path=None):
+        """
+        The snapshot as JSON, also written to path if one is given.
+        """
+        text = json.dumps(self.snapshot(), indent=2)
+        if path is not None:
+            with open(path, "w") as outfile:
+                outfile.write(text)
+        return text
+
+    def prometheus(self):
+        """
+        The metrics in the Prometheus text exposition format, with dots in the names turned into underscores.
+        """
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            metric = name.replace('.', '_') + '_total'
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, (calls, seconds) in sorted(self.timers.items()):
+            if name in self.histograms:
+                continue
+            metric = name.replace('.', '_') + '_seconds'
+            lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_count {calls}")
+            lines.append(f"{metric}_sum {seconds}")
+        for name, counts in sorted(self.histograms.items()):
+            metric = name.replace('.', '_') + '_seconds'
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(HISTOGRAM_BUCKETS, counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+            calls, seconds = self.timers[name]
+            lines.append(f"{metric}_count {calls}")
+            lines.append(f"{metric}_sum {seconds}")
+        return '\n'.join(lines) + '\n'
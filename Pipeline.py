@@ -0,0 +1,108 @@
+from enigma.Enigma import Enigma
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import mmap
+import os
+
+#Bytes of input handed to a worker per task, rounded up to the next message boundary
+DEFAULT_CHUNKSIZE = 1 << 22
+
+#Machine compiled once in each worker process by _init_worker
+_machine = None
+
+
+def _init_worker(settings):
+    global _machine
+    _machine = Enigma(settings)
+
+
+def message_ranges(data, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Splits a buffer of newline separated messages into (start, end) byte ranges of about chunksize bytes,
+     each ending just after a newline (or at the end of the buffer) so no message is cut in two.
+    """
+    ranges = []
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find(b'\n', min(start + chunksize, size) - 1)
+        end = size if end == -1 else end + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _decrypt_range(inpath, outpath, start, end, upper, machine=None):
+    """
+    Decrypts the messages in bytes start to end of inpath into the same bytes of outpath, both memory-mapped.
+    Every message starts from the machine's start positions. Returns the number of messages.
+    """
+    machine = machine or _machine
+    with open(inpath, 'rb') as infile, open(outpath, 'r+b') as outfile, \
+         mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as inmap, \
+         mmap.mmap(outfile.fileno(), 0) as outmap:
+        view = memoryview(inmap)
+        try:
+            messages = 0
+            position = start
+            while position < end:
+                stop = inmap.find(b'\n', position, end)
+                stop = end if stop == -1 else stop
+                if stop > position:
+                    outmap[position:stop] = machine.encode_bytes(view[position:stop], upper=upper)
+                    messages += 1
+                if stop < end:
+                    outmap[stop] = 10 #the newline itself
+                position = stop + 1
+        finally:
+            view.release() #the map cannot close while a view is exported
+    return messages
+
+
+def decrypt_file(settings, inpath, outpath, processes=None, chunksize=DEFAULT_CHUNKSIZE, upper=False):
+    """
+    Decrypts/ encrypts a file of newline separated messages that all use one key (the settings dictionary),
+     each message starting from the key's positions. Bytes other than A-Z are copied through, so outpath ends up
+     the same size as inpath and every worker writes its messages straight into its part of the output map.
+    The input is memory-mapped and split at message boundaries into ranges of about chunksize bytes; the workers
+     get only the paths and the byte offsets, and compile the machine once each. Memory stays bounded by the
+     chunks in flight whatever the size of the file. processes=1 runs everything in this process.
+    With upper=True lowercase letters are upper-cased and encoded too.
+    Returns the number of messages.
+    """
+    size = os.path.getsize(inpath)
+    with open(outpath, 'wb') as outfile:
+        outfile.truncate(size)
+    if size == 0:
+        return 0
+    with open(inpath, 'rb') as infile, mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as inmap:
+        ranges = message_ranges(inmap, chunksize)
+    if processes == 1:
+        machine = Enigma(settings)
+        return sum(_decrypt_range(inpath, outpath, start, end, upper, machine) for start, end in ranges)
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(settings,)) as pool:
+        futures = [pool.submit(_decrypt_range, inpath, outpath, start, end, upper) for start, end in ranges]
+        return sum(future.result() for future in futures)
+
+
+if __name__ == "__main__":
+    """
+    python -m enigma.Pipeline intercepts.txt plaintext.txt --settings '{"Reflector": "B", "Rotors": "I II III",
+        "Rings": "01 01 01", "Positions": "A A Z", "Plugboard": "HL MO AJ CX BZ SR NI YW DG PK"}'
+    """
+    parser = argparse.ArgumentParser(description="Decrypt a file of newline separated messages under one daily key.")
+    parser.add_argument('input', help="file of messages, one per line")
+    parser.add_argument('output', help="file to write, the same size as the input")
+    parser.add_argument('--settings', required=True, help="the key as a JSON settings dictionary, or a path to one")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="bytes of input per task")
+    parser.add_argument('--upper', action='store_true', help="upper-case lowercase letters and encode them too")
+    args = parser.parse_args()
+
+    if os.path.exists(args.settings):
+        with open(args.settings, "r") as infile:
+            settings = json.load(infile)
+    else:
+        settings = json.loads(args.settings)
+    print(decrypt_file(settings, args.input, args.output, args.processes, args.chunksize, args.upper), "messages")
@@ -1,38 +1,91 @@
-from enigma.PlugLead import PlugLead
-
 class Plugboard():
     """
-    Creates a plugboard from either a string passed in the arguments or from pluglead objects.
-    Encodes letters using the pluglead pairs.
+    Creates a plugboard from either a list of lead strings passed in the arguments or from pluglead objects.
+    The leads are compiled into table, a 26-entry involution of letter indices kept up to date as leads are added,
+     removed or swapped, so encoding a letter is a single lookup.
+    A lead that plugs a letter to itself or uses a letter that is already plugged raises ValueError.
     """
     def __init__(self, newplugleads):
-        self.pairs=newplugleads
-        self.plugls=[]
+        self.pairs=[] # the leads as strings, in the order they were plugged in
+        self.table=list(range(26))
+        for pluglead in newplugleads:
+            self.add(pluglead)
+
+    @staticmethod
+    def indices(pluglead):
+        """
+        Letter indices of a lead given as a string like 'AB', a PlugLead or a pair of indices.
+        """
+        if isinstance(pluglead, tuple):
+            a, b = pluglead
+        else:
+            pair=str(pluglead)
+            if len(pair) != 2:
+                raise ValueError(f"A plug lead joins two letters, got {pair!r}")
+            a, b = ord(pair[0])-ord('A'), ord(pair[1])-ord('A')
+        if not (0 <= a < 26 and 0 <= b < 26):
+            raise ValueError(f"Plug leads join letters A-Z, got {pluglead!r}")
+        if a == b:
+            raise ValueError(f"A letter cannot be plugged to itself, got {pluglead!r}")
+        return a, b
 
     def add(self, pluglead):
         """
-        Used to handle pluglead objects.
+        Plugs in a lead (string, PlugLead or pair of indices) and returns the list of leads.
         """
-        self.plugls.append(str(PlugLead(pluglead)))
-        return self.plugls
+        a, b = self.indices(pluglead)
+        for x in (a, b):
+            if self.table[x] != x:
+                raise ValueError(f"{chr(x+ord('A'))} is already plugged to {chr(self.table[x]+ord('A'))}")
+        self.table[a]=b
+        self.table[b]=a
+        self.pairs.append(chr(a+ord('A'))+chr(b+ord('A')))
+        return self.pairs
 
-    def encode(self, inputchar):
+    def remove(self, pluglead):
         """
-        Encodes letters using the pluglead pairs.
-        If Plugboard is instatiated with a list, use that, otherwise create a list from the pluglead strings.
-        If the input character is some of the letters in the pluglead pairs, return the other letter from the pair as resultchar.
+        Unplugs a lead, given either way round.
         """
-        leads = self.pairs
-        if self.pairs==[]:
-           leads=self.plugls
-        resultchar=inputchar
-        for i in range(len(leads)):
-            pair = leads[i]
-            a, b = pair[0], pair[1]
-            if inputchar == a:
-               resultchar = b
-            elif inputchar == b:
-                 resultchar = a
-        return resultchar
+        a, b = self.indices(pluglead)
+        if self.table[a] != b:
+            raise ValueError(f"No lead between {chr(a+ord('A'))} and {chr(b+ord('A'))}")
+        self.table[a]=a
+        self.table[b]=b
+        for pair in (chr(a+ord('A'))+chr(b+ord('A')), chr(b+ord('A'))+chr(a+ord('A'))):
+            if pair in self.pairs:
+                self.pairs.remove(pair)
+        return self.pairs
 
+    def swap(self, old, new):
+        """
+        Replaces one lead by another in constant time, e.g. for the Bombe moving a single stecker.
+        Either may be None to only plug in or only unplug. If new does not fit the board is left as it was.
+        """
+        if old is not None:
+            self.remove(old)
+        if new is not None:
+            try:
+                self.add(new)
+            except ValueError:
+                if old is not None:
+                    self.add(old)
+                raise
+        return self.pairs
 
+    def compose(self, permutation):
+        """
+        The permutation of letter indices seen through the plugboard on both sides: plug, permutation, plug.
+        With the rotor/reflector core permutation of a position state this is the whole machine for that keypress.
+        """
+        table=self.table
+        return [table[permutation[table[x]]] for x in range(26)]
+
+    def encode(self, inputchar):
+        """
+        Encodes letters using the compiled table of pluglead pairs.
+        If the input character is some of the letters in the pluglead pairs, return the other letter from the pair as resultchar.
+        """
+        index=ord(inputchar)-ord('A')
+        if 0 <= index < 26:
+            return chr(self.table[index]+ord('A'))
+        return inputchar
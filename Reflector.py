@@ -1,15 +1,12 @@
 class Reflector:
     def __init__(self, settingsdict):
         self.wiring = settingsdict['wiring'] #get the reflector mapping from the settings dictionary
+        self.map = list(settingsdict['map']) if 'map' in settingsdict else self.maprefl() #compiled once (or taken precompiled), encoderefl is then a lookup
 
     def maprefl(self):
         forward_map = [ord(c) - ord('A') for c in self.wiring] #create indices
         return forward_map
 
     def encoderefl(self, inputchar):
-        map=self.maprefl()
-        stepped_in = (inputchar) % 26 #map and wrap around
-        mapped = map[stepped_in]
-        stepped_out = (mapped) % 26
-        return stepped_out
+        return self.map[inputchar % 26] #map and wrap around
 
@@ -1,14 +1,48 @@
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def conjugate_tables(wiring):
+    """
+    The wiring conjugated by each of the 26 rotations, in both directions: row o of the forward table is the
+     permutation x -> (map[(x+o) % 26] - o) % 26, i.e. the wheel as seen at effective offset o = position - ring.
+    Each table is a tuple of 26 rows of 26 bytes, a compact 26x26 array; cached per wiring and shared by every rotor with it,
+     whatever its ring.
+    """
+    forward = [ord(c) - ord('A') for c in wiring]
+    backward = [0] * 26
+    for i, v in enumerate(forward):
+        backward[v] = i
+    forwardrows = tuple(bytes((forward[(x+o) % 26]-o) % 26 for x in range(26)) for o in range(26))
+    backwardrows = tuple(bytes((backward[(x+o) % 26]-o) % 26 for x in range(26)) for o in range(26))
+    return forwardrows, backwardrows
+
+
+@functools.lru_cache(maxsize=None)
+def position_rows(wiring, ring):
+    """
+    The conjugate tables reordered so that row p is the one for position p at this ring, sharing the rows themselves.
+    """
+    forwardconj, backwardconj = conjugate_tables(wiring)
+    return (tuple(forwardconj[(p-ring) % 26] for p in range(26)),
+            tuple(backwardconj[(p-ring) % 26] for p in range(26)))
+
+
 class Rotor:
     """
         Instantiates rotor objects using the settings dictionary.
         Creates maps for the wiring.
         Encodes letters forward/ backward applying appropriate offsets for positions and rings.
+        forwardrows[p] and backwardrows[p] are the whole wheel at position p (ring included) as one permutation,
+         so encoding through it is a single indexed read and a rotor stack can be composed row by row.
     """
     def __init__(self, settingsdict):
         self.wiring = settingsdict['wiring']
         self.position = settingsdict["position"]
         self.ring = ord(settingsdict["ring"])-ord('A')
         self.notch = settingsdict["notch"]
+        #Conjugate tables indexed by position, shared by every rotor with this wiring and ring
+        self.forwardrows, self.backwardrows = position_rows(self.wiring, self.ring)
 
     #Create the forward map using the wiring mapping
     def rotormapforward(self):
@@ -24,19 +58,11 @@ class Rotor:
 
     #Encode a letter using the forward map, applying position and ring offsets
     def encodeforward(self, inputchar, offsetpos):
-        mapfwd=self.rotormapforward()
-        stepped_in = (inputchar+offsetpos-self.ring) % 26 #add the offsets and wrap around
-        mapped = mapfwd[stepped_in]
-        stepped_out = (mapped-offsetpos+self.ring) % 26
-        return stepped_out
+        return self.forwardrows[offsetpos % 26][inputchar]
 
     #Encode a letter using the backward map, adjusting for position and ring settings
     def encodebackward(self, inputchar, offsetpos):
-        mapbwd = self.rotormapbackward()
-        stepped_in = (inputchar+offsetpos-self.ring) % 26
-        mapped = mapbwd[stepped_in]
-        stepped_out = (mapped-offsetpos+self.ring) % 26
-        return stepped_out
+        return self.backwardrows[offsetpos % 26][inputchar]
 
     #Simple rotor for the task
     def simplerotorforward(self, inputchar):
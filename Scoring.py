@@ -0,0 +1,93 @@
+import csv
+import math
+
+#Relative frequency (%) of each letter A-Z in English text, the default unigram table
+ENGLISH_FREQUENCIES = [8.17, 1.29, 2.78, 4.25, 12.70, 2.23, 2.02, 6.09, 6.97, 0.15, 0.77, 4.03, 2.41,
+                       6.75, 7.51, 1.93, 0.10, 5.99, 6.33, 9.06, 2.76, 0.98, 2.36, 0.15, 1.97, 0.07]
+
+
+def index_of_coincidence(indices):
+    """
+    Probability that two letters drawn from the text are the same; about 0.066 for English, 0.038 for random letters.
+    indices is a sequence of letter indices 0-25.
+    """
+    counts = [0] * 26
+    for letter in indices:
+        counts[letter] += 1
+    total = len(indices)
+    if total < 2:
+        return 0.0
+    return sum(c * (c - 1) for c in counts) / (total * (total - 1))
+
+
+class Scorer:
+    """
+    N-gram log-likelihood scorer for candidate decryptions.
+    The table is a flat list of log-probabilities indexed by the n-gram as a base-26 integer,
+     so scoring is one list lookup per letter with a rolling index, no strings involved.
+    Built from English letter frequencies by default, or from a text or an n-gram counts file.
+    """
+    def __init__(self, counts=None, n=1):
+        """
+        - counts: {ngram string: count}; None for the built-in English letter frequencies
+        - n: n-gram length, must match the keys of counts
+        """
+        if counts is None:
+            counts = {chr(i + ord('A')): f for i, f in enumerate(ENGLISH_FREQUENCIES)}
+            n = 1
+        self.n = n
+        self.size = 26 ** n
+        total = sum(counts.values())
+        floor = math.log10(0.01 / total) #unseen n-grams get a small but finite penalty
+        self.table = [floor] * self.size
+        for ngram, count in counts.items():
+            if len(ngram) != n:
+                raise ValueError(f"N-gram {ngram!r} does not have length {n}")
+            self.table[self.index(ngram)] = math.log10(count / total)
+
+    @classmethod
+    def from_text(cls, text, n=2):
+        """
+        Counts the n-grams of a training text (letters only, case-insensitive).
+        """
+        letters = [c for c in text.upper() if 'A' <= c <= 'Z']
+        counts = {}
+        for i in range(len(letters) - n + 1):
+            ngram = ''.join(letters[i:i + n])
+            counts[ngram] = counts.get(ngram, 0) + 1
+        return cls(counts, n)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads n-gram counts from a CSV with columns Ngram,Count, in the style of CSVMapping.csv.
+        """
+        counts = {}
+        with open(path, "r", encoding="utf-8-sig", newline="") as csvfile:
+            for row in csv.DictReader(csvfile):
+                counts[row['Ngram'].strip().upper()] = float(row['Count'])
+        n = len(next(iter(counts)))
+        return cls(counts, n)
+
+    @staticmethod
+    def index(ngram):
+        """
+        Base-26 integer index of an n-gram string.
+        """
+        index = 0
+        for c in ngram:
+            index = index * 26 + ord(c) - ord('A')
+        return index
+
+    def score(self, indices):
+        """
+        Log10-likelihood of a sequence of letter indices under the n-gram table; higher is more English-like.
+        """
+        table, size, n = self.table, self.size, self.n
+        index = 0
+        total = 0.0
+        for i, letter in enumerate(indices):
+            index = (index * 26 + letter) % size
+            if i >= n - 1:
+                total += table[index]
+        return total
@@ -0,0 +1,129 @@
+from enigma.Enigma import Enigma
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+
+#Settings that make up a machine configuration; messages that agree on all of them share one compiled Enigma
+MACHINE_KEYS = ('Reflector', 'ReflectorWiring', 'Rotors', 'Rings', 'Plugboard')
+
+
+def machine_key(settings):
+    """
+    Hashable key of the compiled machine a settings dictionary needs: everything but the start positions,
+     with the plug leads in a canonical order so 'AB CD' and 'DC BA' land in the same group.
+    """
+    key = []
+    for name in MACHINE_KEYS:
+        value = settings.get(name)
+        if name == 'Plugboard':
+            leads = value.split() if isinstance(value, str) else [str(lead) for lead in value or []]
+            value = ' '.join(sorted(''.join(sorted(lead)) for lead in leads))
+        elif isinstance(value, str):
+            value = ' '.join(value.split())
+        key.append(value)
+    return tuple(key)
+
+
+def group_messages(pairs, chunksize=None):
+    """
+    Groups (settings, ciphertext) pairs by machine configuration.
+    Returns a list of (settings, [(index, positions, ciphertext)]) with index the position of the pair in the input;
+     groups longer than chunksize are split so the pool can share them out.
+    """
+    groups = {}
+    for index, (settings, ciphertext) in enumerate(pairs):
+        key = machine_key(settings)
+        if key not in groups:
+            groups[key] = (settings, [])
+        groups[key][1].append((index, settings['Positions'], ciphertext))
+    tasks = []
+    for settings, messages in groups.values():
+        step = chunksize or len(messages)
+        for start in range(0, len(messages), step):
+            tasks.append((settings, messages[start:start + step]))
+    return tasks
+
+
+def decrypt_group(settings, messages):
+    """
+    Decrypts the messages of one group with a single compiled machine, only moving its start positions per message.
+    Returns [(index, plaintext)]. Runs in the worker processes of decrypt_batch and MessageService.
+    """
+    machine = Enigma(settings)
+    results = []
+    for index, positions, ciphertext in messages:
+        machine.positions = [ord(p) - ord('A') for p in positions.split()]
+        results.append((index, machine.enigma_encode(ciphertext)))
+    return results
+
+
+def decrypt_batch(pairs, processes=None, chunksize=None):
+    """
+    Decrypts/ encrypts many (settings, ciphertext) pairs, returning the texts in input order.
+    Pairs are grouped by machine configuration so each group's tables are compiled once, and the groups
+     run on a pool of processes; processes=1 runs everything in this process instead.
+    """
+    pairs = list(pairs)
+    tasks = group_messages(pairs, chunksize)
+    results = [None] * len(pairs)
+    if processes == 1:
+        for settings, messages in tasks:
+            for index, plaintext in decrypt_group(settings, messages):
+                results[index] = plaintext
+        return results
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for done in pool.map(decrypt_group, [settings for settings, _ in tasks], [messages for _, messages in tasks]):
+            for index, plaintext in done:
+                results[index] = plaintext
+    return results
+
+
+class MessageService:
+    """
+    Long-lived front end over a process pool for a message ingestion service.
+    decrypt() blocks until a batch is done; decrypt_async() is a coroutine, so an asyncio service can submit
+     batches and keep serving while the workers decrypt. Batches are grouped as in decrypt_batch.
+    Use it as a (synchronous) context manager or call close() to shut the pool down.
+    """
+    def __init__(self, processes=None, chunksize=256):
+        self.chunksize = chunksize
+        self.pool = ProcessPoolExecutor(max_workers=processes)
+
+    def submit(self, pairs):
+        """
+        Submits a batch and returns (number of pairs, list of futures of the groups' results).
+        """
+        pairs = list(pairs)
+        tasks = group_messages(pairs, self.chunksize)
+        return len(pairs), [self.pool.submit(decrypt_group, settings, messages) for settings, messages in tasks]
+
+    @staticmethod
+    def _collect(size, groupresults):
+        results = [None] * size
+        for done in groupresults:
+            for index, plaintext in done:
+                results[index] = plaintext
+        return results
+
+    def decrypt(self, pairs):
+        """
+        Decrypts a batch of (settings, ciphertext) pairs and returns the texts in input order.
+        """
+        size, futures = self.submit(pairs)
+        return self._collect(size, [future.result() for future in futures])
+
+    async def decrypt_async(self, pairs):
+        """
+        Awaitable version of decrypt; the event loop is free while the workers run.
+        """
+        size, futures = self.submit(pairs)
+        groupresults = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        return self._collect(size, groupresults)
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
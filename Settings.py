@@ -1,32 +1,73 @@
 import os
-import csv
+from types import MappingProxyType
 
+#Process-wide wiring catalogue: parsed on first use, and again only after invalidate_catalogue() or reload_catalogue()
+_catalogue = None
 
-class Settings:
+
+def mapping_path():
     """
-    Takes the settings file used to instantiate an Enigma object and processes it into structures to be consumed by other methods.
+    Location of the mapping file for rotors and reflectors.
     """
+    #ensures the file can be found
+    base_dir = os.path.dirname(__file__)
+    return os.path.normpath(os.path.join(base_dir, "..", "wiring", "CSVMapping.csv"))
 
-    def __init__(self, inputsettings):
-        self.inputsettings = inputsettings
-        self.mappings = self.load_mapping()
 
-    #Loads mappings for rotors and reflectors
-    def load_mapping(self):
+def load_catalogue():
+    """
+    Returns the read-only wiring catalogue {element: {'wiring': ..., 'notch': ..., 'forward': ...}},
+     where forward is the wiring precompiled into a tuple of letter indices, the map of a reflector.
+    Nothing is read until the first call, and later calls return the cached catalogue without touching the disk;
+     after rewriting the mapping file call reload_catalogue().
+    """
+    global _catalogue
+    if _catalogue is None:
+        import csv #only needed to parse the mapping file, so it stays out of the import path
         wmapping = {}
-        #ensures the file can be found
-        base_dir = os.path.dirname(__file__)
-        csv_path = os.path.normpath(os.path.join(base_dir, "..", "wiring", "CSVMapping.csv"))
-
-        with open(csv_path, "r", encoding="utf-8-sig", newline="") as csvfile:
+        with open(mapping_path(), "r", encoding="utf-8-sig", newline="") as csvfile:
             reader = csv.DictReader(csvfile)
             # Each row is a dict with keys "name", "wiring", "notch"
             for row in reader:
                 element = row['Element'].strip()
                 wiring = row['Wiring'].strip()
                 notch = row.get('Notch').strip()
-                wmapping[element] = {'wiring': wiring, 'notch': notch} #generates a dictionary for each element
-        return wmapping
+                forward = tuple(ord(c) - ord('A') for c in wiring)
+                #generates a read-only dictionary for each element
+                wmapping[element] = MappingProxyType({'wiring': wiring, 'notch': notch, 'forward': forward})
+        _catalogue = MappingProxyType(wmapping)
+    return _catalogue
+
+
+def invalidate_catalogue():
+    """
+    Forces the next load_catalogue() to parse the mapping file again, e.g. right after rewriting it.
+    """
+    global _catalogue
+    _catalogue = None
+
+
+def reload_catalogue():
+    """
+    Parses the mapping file again straight away and returns the new catalogue.
+    Machines compiled before keep the wirings they were built with.
+    """
+    invalidate_catalogue()
+    return load_catalogue()
+
+
+class Settings:
+    """
+    Takes the settings file used to instantiate an Enigma object and processes it into structures to be consumed by other methods.
+    """
+
+    def __init__(self, inputsettings):
+        self.inputsettings = inputsettings
+        self.mappings = self.load_mapping()
+
+    #Loads mappings for rotors and reflectors from the shared catalogue
+    def load_mapping(self):
+        return load_catalogue()
 
     def get_rotors(self):
         """
@@ -55,13 +96,19 @@ class Settings:
     def get_reflector(self):
         """
         Return a dict for the chosen reflector with keys: 'element', 'wiring'
-        Looks up in the same specs dict as rotors.
+        Looks up in the same specs dict as rotors, unless the settings carry the wiring itself under 'ReflectorWiring'
+         (an in-memory override, e.g. the rewired reflector variants generated by the Bombe).
         """
         ref = self.inputsettings.get('Reflector')
+        override = self.inputsettings.get('ReflectorWiring')
+        if override:
+            if sorted(override) != [chr(i + ord('A')) for i in range(26)]:
+                raise ValueError(f"Reflector wiring must be a permutation of A-Z, got {override!r}")
+            return {'element': ref, 'wiring': override}
         spec = self.mappings.get(ref)
         if spec is None:
             raise ValueError(f"Unknown reflector element: {ref}")
-        return {'element': ref, 'wiring': spec['wiring']}
+        return {'element': ref, 'wiring': spec['wiring'], 'map': spec['forward']}
 
     def get_plugboard_mapping(self):
         """
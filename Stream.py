@@ -0,0 +1,47 @@
+class EnigmaStream:
+    """
+    Stateful streaming encoder around a compiled Enigma.
+    The rotor positions carry over from one chunk to the next, so a message can be pushed through in pieces of any size
+     (strings, bytes, bytearrays, memoryviews, iterators of those, or binary file objects) with constant memory.
+    Each chunk goes through Enigma.encode_bytes, so long chunks take the bulk translate path.
+    Bytes other than A-Z pass through without a keypress.
+    Chunk start positions rarely repeat, so stream chunks bypass the shared stepping sequence cache.
+    Save self.positions to resume later with EnigmaStream(enigma, positions=saved) or enigma.stream(saved).
+    """
+    def __init__(self, enigma, positions=None):
+        self.enigma = enigma
+        if positions is None:
+            positions = enigma.positions
+        if len(positions) != len(enigma.positions):
+            raise ValueError(f"Expected {len(enigma.positions)} rotor positions, got {len(positions)}")
+        self.positions = [p if isinstance(p, int) else ord(p) - ord('A') for p in positions] #letters or indices
+
+    def encode(self, chunk):
+        """
+        Encodes one chunk and advances the rotors. Returns a str for str input, otherwise a bytearray.
+        """
+        if isinstance(chunk, str):
+            return self.enigma.encode_bytes(chunk.encode('ascii'), upper=False, positions=self.positions).decode('ascii')
+        inputbytes = memoryview(chunk).cast('B') #zero-copy view of any bytes-like chunk
+        return self.enigma.encode_bytes(inputbytes, upper=False, positions=self.positions)
+
+    def encode_iter(self, chunks):
+        """
+        Generator over an iterable of chunks, yielding each encoded chunk in turn.
+        """
+        for chunk in chunks:
+            yield self.encode(chunk)
+
+    def encode_file(self, infile, outfile, chunksize=1 << 16):
+        """
+        Encodes a binary file object into another, chunksize bytes at a time, reading into one reused buffer.
+        Returns the number of bytes written.
+        """
+        inputbytes = bytearray(chunksize)
+        total = 0
+        while True:
+            size = infile.readinto(inputbytes)
+            if not size:
+                return total
+            outfile.write(self.enigma.encode_bytes(memoryview(inputbytes)[:size], upper=False, positions=self.positions))
+            total += size
@@ -1,11 +1,25 @@
-from abc import ABC
-from abc import abstractmethod
-from enigma.PlugLead import PlugLead
-from enigma.Plugboard import Plugboard
-from enigma.Settings import Settings
-from enigma.Rotor import Rotor
-from enigma.Reflector import Reflector
-from enigma.Enigma import Enigma
+import importlib
+
+#Names this module exposes and the module each one comes from; they are imported the first time they are used
+_LAZY = {'PlugLead': 'enigma.PlugLead',
+         'Plugboard': 'enigma.Plugboard',
+         'Settings': 'enigma.Settings',
+         'Rotor': 'enigma.Rotor',
+         'Reflector': 'enigma.Reflector',
+         'Enigma': 'enigma.Enigma',
+         'Bombe': 'enigma.Bombe'}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value #cached, so this only runs once per name
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
 
 
 if __name__ == "__main__":
@@ -15,6 +29,7 @@ if __name__ == "__main__":
 
     inputsettings = {'Reflector': 'D', 'Rotors': 'V II IV', 'Rings': '06 18 07', 'Positions': 'A J L', 'Plugboard': 'UG IE PO NX WT'}
     inputstr='HWREISXLGTTBYVXRCWWJAKZDTVZWKBDJPVQYNEQIOTIFX'
+    from enigma.Enigma import Enigma
     newenigma=Enigma(inputsettings)
     print(newenigma.enigma_encode(inputstr))
 
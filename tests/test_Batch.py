@@ -0,0 +1,36 @@
+import random
+import pytest
+from enigma.Enigma import Enigma
+from enigma.Batch import encode_many, rows_with_crib
+
+
+def random_settings(generator, nrotors):
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    shuffled = generator.sample(letters, 12)
+    rotors = generator.sample(['I', 'II', 'III', 'IV', 'V'], 3)
+    if nrotors == 4:
+        rotors = [generator.choice(['Beta', 'Gamma'])] + rotors
+    return {'Reflector': generator.choice('ABC'),
+            'Rotors': ' '.join(rotors),
+            'Rings': ' '.join('%02d' % generator.randint(1, 26) for _ in rotors),
+            'Positions': ' '.join(generator.choice(letters) for _ in rotors),
+            'Plugboard': ' '.join(shuffled[i] + shuffled[i + 1] for i in range(0, 12, 2))}
+
+
+@pytest.mark.parametrize('nrotors', [3, 4])
+def test_encode_many_matches_enigma(nrotors):
+    generator = random.Random(nrotors)
+    batch = [random_settings(generator, nrotors) for _ in range(40)]
+    ciphertext = ''.join(generator.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(700)) #past a middle wheel notch
+    letters = encode_many(batch, ciphertext)
+    assert letters.shape == (len(batch), len(ciphertext))
+    for row, settings in zip(letters, batch):
+        assert row.tobytes().decode() == Enigma(settings).enigma_encode(ciphertext)
+    found = rows_with_crib(letters, letters[7, 100:110].tobytes().decode())
+    assert found[7]
+
+
+def test_batch_needs_one_rotor_count():
+    generator = random.Random(0)
+    with pytest.raises(ValueError):
+        encode_many([random_settings(generator, 3), random_settings(generator, 4)], 'HELLO')
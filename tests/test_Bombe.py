@@ -0,0 +1,105 @@
+import itertools
+import json
+import pytest
+from enigma.Enigma import Enigma
+from enigma.Bombe import Bombe
+from enigma.Plugboard import Plugboard
+from enigma.Examples import EXAMPLES
+
+
+def test_batch_solve_resumes_from_checkpoint(tmp_path):
+    """
+    A batch-mode search resumed part way through the positions still finds the key of Code 2.
+    """
+    name, code, crib, knownsettings, permittedsettings = EXAMPLES[1]
+    bombe = Bombe(code, crib, knownsettings, permittedsettings, batchsize=500)
+    checkpoint = tmp_path / 'checkpoint.json'
+    checkpoint.write_text(json.dumps({'fingerprint': bombe._fingerprint(), 'done': 3000, 'total': 17576}))
+    plaintext = bombe.solve(checkpoint=str(checkpoint))
+    assert plaintext == 'IHOPEYOUAREENJOYINGTHEUNIVERSITYOFBATHEXPERIENCESOFAR'
+    assert bombe.solution['Positions'] == 'I M G'
+
+
+@pytest.mark.parametrize('cribpos', [-1, 44])
+def test_cribpos_out_of_range(cribpos):
+    name, code, crib, knownsettings, permittedsettings = EXAMPLES[1]
+    assert len(code) - len(crib) == 43
+    Bombe(code, crib, knownsettings, permittedsettings, cribpos=43) #the last window that fits
+    with pytest.raises(ValueError):
+        Bombe(code, crib, knownsettings, permittedsettings, cribpos=cribpos)
+
+
+def test_cribpos_checks_only_that_window():
+    name, code, crib, knownsettings, permittedsettings = EXAMPLES[1]
+    plaintext = 'IHOPEYOUAREENJOYINGTHEUNIVERSITYOFBATHEXPERIENCESOFAR'
+    bombe = Bombe(code, crib, knownsettings, permittedsettings, cribpos=plaintext.index(crib))
+    assert bombe.solve() == plaintext
+
+
+@pytest.mark.parametrize('batchsize', [None, 500])
+def test_known_plugboard_reusing_a_letter_finds_nothing(batchsize):
+    name, code, crib, knownsettings, permittedsettings = EXAMPLES[1]
+    knownsettings = dict(knownsettings, Plugboard=knownsettings['Plugboard'] + ' ' + knownsettings['Plugboard'][:1] + 'Q')
+    assert Bombe(code, crib, knownsettings, permittedsettings, batchsize=batchsize).solve() is None
+
+
+def test_reflector_search_with_invalid_plugboard_finds_nothing():
+    name, code, crib, knownsettings, permittedsettings = EXAMPLES[4]
+    knownsettings = dict(knownsettings, Plugboard='UG IE PO NX WT UQ')
+    assert Bombe(code, crib, knownsettings, permittedsettings).solve() is None
+
+
+def test_statistical_keeps_to_permitted_rings_and_known_positions():
+    settings = {'Reflector': 'B', 'Rotors': 'I II III', 'Rings': '05 06 05', 'Positions': 'A B C', 'Plugboard': ''}
+    code = Enigma(settings).enigma_encode('THEQUICKBROWNFOXJUMPSOVERTHELAZYDOGANDKEEPSONRUNNINGUNTILITREACHESTHEEND')
+    known = {'Reflector': 'B', 'Rotors': 'I II III', 'Rings': 'x x x', 'Positions': 'A x x', 'Plugboard': ''}
+    permitted = {'Reflector': '', 'Rotors': '', 'Rings': '05 06', 'Positions': 'A B C', 'Plugboard': ''}
+    results = Bombe(code, '', known, permitted).solve_statistical(topk=3)
+    assert results
+    for score, found, plaintext in results:
+        assert set(found['Rings'].split()) <= {'05', '06'}
+        assert found['Positions'].split()[0] == 'A'
+
+
+def code4_branch():
+    """
+    Bombe for Code 4 and its branch machine at the solved rotor setting, with the plugboard left to find.
+    """
+    name, code, crib, knownsettings, permittedsettings = EXAMPLES[3]
+    bombe = Bombe(code, crib, knownsettings, permittedsettings)
+    machine = Enigma(dict(knownsettings, Plugboard=''))
+    return bombe, machine
+
+
+def leads(domains, combo):
+    return ' '.join(''.join(chr(x + ord('A')) for x in domains[slot][option]) for slot, option in enumerate(combo))
+
+
+def test_menu_finds_the_code4_plugboard():
+    bombe, machine = code4_branch()
+    domains = bombe._plugboard_domains()
+    offsets = bombe._crib_offsets(machine)
+    candidates = list(bombe._menu_plugboards(machine, domains, bombe._core_sequence(machine, offsets)))
+    assert [leads(domains, combo) for combo in candidates] == ['WP RJ AT VF IK HN CG BS'] #of 625 boards the template allows
+
+
+def test_check_incremental_agrees_with_check():
+    bombe, machine = code4_branch()
+    domains = bombe._plugboard_domains()
+    offsets = bombe._crib_offsets(machine)
+    cores = bombe._core_sequence(machine, offsets)
+    witnesses = {}
+    previous = [None] * 26 #every letter counts as changed for the first board
+    hits = []
+    for combo in itertools.product(*(range(len(domain)) for domain in domains)):
+        try:
+            board = Plugboard([domains[slot][option] for slot, option in enumerate(combo)])
+        except ValueError:
+            continue
+        touched = {x for x in range(26) if board.table[x] != previous[x]}
+        previous = board.table
+        found = bombe._check_incremental(cores, offsets, board.table, touched, witnesses)
+        assert found == bombe._check(machine, board.table), leads(domains, combo)
+        if found:
+            hits.append(leads(domains, combo))
+    assert hits == ['WP RJ AT VF IK HN CG BS']
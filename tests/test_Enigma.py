@@ -0,0 +1,85 @@
+import random
+import pytest
+from enigma.Enigma import Enigma, BULK_MIN_REPEATS, BULK_COLD_REPEATS
+
+SETTINGS = {'Reflector': 'B', 'Rotors': 'Beta I III', 'Rings': '23 02 10', 'Positions': 'I M G',
+            'Plugboard': 'VH PT ZG BJ EY FS'}
+
+
+def message(length, seed=0, alphabet='ABCDEFGHIJKLMNOPQRSTUVWXYZ'):
+    generator = random.Random(seed)
+    return ''.join(generator.choice(alphabet) for _ in range(length))
+
+
+def reference_encode(machine, text):
+    """
+    Letter by letter with step_rotors and the Rotor objects, independent of the stepping sequence and the bulk tables.
+    """
+    positions = list(machine.positions)
+    output = []
+    for c in text:
+        if not 'A' <= c <= 'Z':
+            output.append(c)
+            continue
+        Enigma.step_rotors(positions, machine.notches)
+        x = machine.plugmap[ord(c) - ord('A')]
+        for j in range(len(positions) - 1, -1, -1):
+            x = machine.rotors[j].encodeforward(x, positions[j])
+        x = machine.reflectormap[x]
+        for j in range(len(positions)):
+            x = machine.rotors[j].encodebackward(x, positions[j])
+        output.append(chr(machine.plugmap[x] + ord('A')))
+    return ''.join(output)
+
+
+@pytest.mark.parametrize('length', [BULK_MIN_REPEATS * 676 - 1, BULK_MIN_REPEATS * 676,
+                                    BULK_COLD_REPEATS * 676 - 1, BULK_COLD_REPEATS * 676])
+def test_bulk_path_matches_stepping(length):
+    machine = Enigma(SETTINGS)
+    text = message(length, seed=length, alphabet='ABCDEFGHIJKLMNOPQRSTUVWXYZ .')
+    expected = reference_encode(machine, text)
+    assert machine.enigma_encode(text) == expected
+    assert machine.enigma_encode(text) == expected #again, with whatever the first call cached
+
+
+def test_bulk_tables_only_built_for_long_input():
+    machine = Enigma(SETTINGS)
+    machine.encode_bytes(message(BULK_COLD_REPEATS * 676 - 1).encode())
+    assert not machine.bulktables #cheaper through the letter loop than building the tables
+    machine.encode_bytes(message(BULK_COLD_REPEATS * 676).encode())
+    assert tuple(machine.positions) in machine.bulktables
+    text = message(BULK_MIN_REPEATS * 676, seed=1)
+    assert machine.encode_bytes(text.encode()).decode() == reference_encode(machine, text) #cached tables reused
+
+
+def test_encode_bytes_policies():
+    machine = Enigma(SETTINGS)
+    text = 'Hello, World'
+    assert machine.encode_bytes(text.encode(), nonletters='strip').decode() == reference_encode(machine, 'HELLOWORLD')
+    assert machine.encode_bytes(text.encode()).decode() == reference_encode(machine, text.upper())
+    assert machine.encode_bytes(text.encode(), upper=False).decode() == reference_encode(machine, text)
+    with pytest.raises(ValueError):
+        machine.encode_bytes(b'AB C', nonletters='error')
+
+
+def test_encode_bytes_advances_positions():
+    machine = Enigma(SETTINGS)
+    text = message(30000)
+    positions = list(machine.positions)
+    first = machine.encode_bytes(text[:20000].encode(), positions=positions)
+    second = machine.encode_bytes(text[20000:].encode(), positions=positions)
+    assert (first + second).decode() == reference_encode(machine, text)
+
+
+@pytest.mark.parametrize('settings', [SETTINGS,
+                                      dict(SETTINGS, Rotors='I II III', Positions='A D U'), #double step within a few keys
+                                      dict(SETTINGS, Rotors='Beta II IV I', Rings='01 01 01 01', Positions='A E J P')])
+def test_positions_at_matches_stepping(settings):
+    machine = Enigma(settings)
+    positions = list(machine.positions)
+    for keypresses in range(3 * 26 * 26 + 5):
+        assert machine.positions_at(keypresses) == positions, keypresses
+        Enigma.step_rotors(positions, machine.notches)
+    for keypresses in range(3 * 26 * 26 + 5, 100000):
+        Enigma.step_rotors(positions, machine.notches)
+    assert machine.positions_at(100000) == positions #a long jump past several full periods
@@ -0,0 +1,41 @@
+import random
+import pytest
+from enigma.Enigma import Enigma
+from enigma.Pipeline import decrypt_file, message_ranges
+
+SETTINGS = {'Reflector': 'B', 'Rotors': 'I II III', 'Rings': '01 01 01', 'Positions': 'A A Z',
+            'Plugboard': 'HL MO AJ CX BZ SR NI YW DG PK'}
+
+
+def messages(count, seed=0):
+    generator = random.Random(seed)
+    return [''.join(generator.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ ') for _ in range(generator.randint(0, 400)))
+            for _ in range(count)]
+
+
+def test_message_ranges_split_at_newlines():
+    data = b'AAA\nBB\n\nCCCC\nD'
+    for chunksize in range(1, len(data) + 2):
+        ranges = message_ranges(data, chunksize)
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+        for (start, end), (nextstart, _) in zip(ranges, ranges[1:]):
+            assert end == nextstart and data[end - 1:end] == b'\n'
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_decrypt_file_round_trip(tmp_path, processes):
+    plaintexts = messages(60)
+    ciphertexts = [Enigma(SETTINGS).enigma_encode(text) for text in plaintexts]
+    inpath, outpath, backpath = tmp_path / 'in.txt', tmp_path / 'out.txt', tmp_path / 'back.txt'
+    inpath.write_bytes('\n'.join(ciphertexts).encode() + b'\n')
+    assert decrypt_file(SETTINGS, inpath, outpath, processes=processes, chunksize=1000) == sum(1 for t in plaintexts if t)
+    assert outpath.read_bytes() == '\n'.join(plaintexts).encode() + b'\n'
+    decrypt_file(SETTINGS, outpath, backpath, processes=processes, chunksize=1000)
+    assert backpath.read_bytes() == inpath.read_bytes()
+
+
+def test_decrypt_empty_file(tmp_path):
+    inpath, outpath = tmp_path / 'in.txt', tmp_path / 'out.txt'
+    inpath.write_bytes(b'')
+    assert decrypt_file(SETTINGS, inpath, outpath, processes=1) == 0
+    assert outpath.read_bytes() == b''
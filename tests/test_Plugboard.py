@@ -0,0 +1,27 @@
+import pytest
+from enigma.Plugboard import Plugboard
+from enigma.PlugLead import PlugLead
+
+
+@pytest.mark.parametrize('leads', [['AA'], ['AB', 'BC'], ['AB', 'CA'], ['AB', 'BA'], ['A'], ['A1']])
+def test_invalid_leads_raise(leads):
+    with pytest.raises(ValueError):
+        Plugboard(leads)
+
+
+def test_leads_in_any_form():
+    board = Plugboard(['AB', PlugLead('CD'), (4, 5)])
+    assert board.pairs == ['AB', 'CD', 'EF']
+    assert [board.encode(c) for c in 'ABCDEFGZ'] == list('BADCFEGZ')
+
+
+def test_swap_rolls_back_when_the_new_lead_does_not_fit():
+    board = Plugboard(['AB', 'CD'])
+    with pytest.raises(ValueError):
+        board.swap('AB', 'CE') #C is still on CD
+    assert board.pairs == ['CD', 'AB']
+    assert board.table == Plugboard(['AB', 'CD']).table
+    board.swap('BA', 'EF') #a lead can be named either way round
+    assert board.table == Plugboard(['CD', 'EF']).table
+    with pytest.raises(ValueError):
+        board.remove('AB')
@@ -0,0 +1,40 @@
+import math
+import pytest
+from enigma.Scoring import ENGLISH_FREQUENCIES, Scorer, index_of_coincidence
+
+
+def letters(text):
+    return [ord(c) - ord('A') for c in text]
+
+
+def test_index_is_base_26():
+    assert Scorer.index('A') == 0
+    assert Scorer.index('Z') == 25
+    assert Scorer.index('BA') == 26
+    assert Scorer.index('ZZZ') == 26 ** 3 - 1
+
+
+@pytest.mark.parametrize('n', [1, 2, 3])
+def test_score_sums_each_ngram_of_the_text(n):
+    scorer = Scorer.from_text('THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG THEN THE CAT', n)
+    assert len(scorer.table) == 26 ** n
+    text = 'THEREDFOXQQ'
+    expected = sum(scorer.table[Scorer.index(text[i:i + n])] for i in range(len(text) - n + 1))
+    assert scorer.score(letters(text)) == pytest.approx(expected)
+    assert scorer.table[Scorer.index('THE'[:n])] > scorer.table[Scorer.index('QQQ'[:n])] #seen beats unseen
+    assert scorer.score(letters('T' * (n - 1))) == 0.0 #too short for a single n-gram
+
+
+def test_default_scorer_uses_english_frequencies():
+    scorer = Scorer()
+    total = sum(ENGLISH_FREQUENCIES)
+    assert scorer.table[Scorer.index('E')] == pytest.approx(math.log10(ENGLISH_FREQUENCIES[4] / total))
+    assert scorer.score(letters('ETAOIN')) > scorer.score(letters('ZQXJKV'))
+    with pytest.raises(ValueError):
+        Scorer({'AB': 1, 'C': 2}, n=2)
+
+
+def test_index_of_coincidence():
+    assert index_of_coincidence(letters('AAAA')) == 1.0
+    assert index_of_coincidence(letters('ABCD')) == 0.0
+    assert index_of_coincidence([]) == 0.0
@@ -0,0 +1,45 @@
+import asyncio
+import random
+import pytest
+from enigma.Enigma import Enigma
+from enigma.Service import MessageService, decrypt_batch, group_messages, machine_key
+
+KEYS = [{'Reflector': 'B', 'Rotors': 'I II III', 'Rings': '01 01 01', 'Plugboard': 'HL MO AJ CX'},
+        {'Reflector': 'C', 'Rotors': 'Beta V II IV', 'Rings': '03 14 02 26', 'Plugboard': 'QW ER'}]
+
+
+def pairs(count, seed=0):
+    generator = random.Random(seed)
+    result = []
+    for _ in range(count):
+        key = generator.choice(KEYS)
+        settings = dict(key, Positions=' '.join(generator.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in key['Rings'].split()))
+        text = ''.join(generator.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(generator.randint(1, 200)))
+        result.append((settings, text))
+    return result
+
+
+def test_machine_key_ignores_positions_and_lead_order():
+    settings = dict(KEYS[0], Positions='A B C')
+    assert machine_key(settings) == machine_key(dict(settings, Positions='Z Z Z', Plugboard='XC JA OM LH'))
+    assert machine_key(settings) != machine_key(KEYS[1])
+    assert len(group_messages(pairs(50))) == 2
+    assert len(group_messages(pairs(50), chunksize=10)) > 2
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_decrypt_batch_round_trip(processes):
+    batch = pairs(50)
+    expected = [Enigma(settings).enigma_encode(text) for settings, text in batch]
+    ciphertexts = decrypt_batch(batch, processes=processes, chunksize=7)
+    assert ciphertexts == expected
+    assert decrypt_batch(zip([settings for settings, _ in batch], ciphertexts), processes=processes) == \
+        [text for _, text in batch]
+
+
+def test_message_service():
+    batch = pairs(30, seed=1)
+    expected = [Enigma(settings).enigma_encode(text) for settings, text in batch]
+    with MessageService(processes=2, chunksize=5) as service:
+        assert service.decrypt(batch) == expected
+        assert asyncio.run(service.decrypt_async(batch)) == expected
@@ -0,0 +1,25 @@
+import pytest
+from enigma import Settings
+from enigma.Enigma import Enigma
+
+
+def test_catalogue_cached_until_reloaded(monkeypatch, tmp_path):
+    catalogue = Settings.load_catalogue()
+    monkeypatch.setattr(Settings, 'mapping_path', lambda: str(tmp_path / 'missing.csv'))
+    assert Settings.load_catalogue() is catalogue #no disk access once loaded
+    with pytest.raises(FileNotFoundError):
+        Settings.reload_catalogue()
+    monkeypatch.undo()
+    reloaded = Settings.reload_catalogue()
+    assert reloaded is not catalogue and dict(reloaded) == dict(catalogue)
+    assert Settings.load_catalogue() is reloaded
+
+
+def test_catalogue_entries():
+    catalogue = Settings.load_catalogue()
+    assert catalogue['I']['wiring'] == 'EKMFLGDQVZNTOWYHXUSPAIBRCJ' and catalogue['I']['notch'] == 'Q'
+    assert catalogue['B']['forward'] == tuple(ord(c) - ord('A') for c in catalogue['B']['wiring'])
+    with pytest.raises(TypeError):
+        catalogue['I']['wiring'] = 'ABC' #read-only, shared by every machine
+    assert Enigma({'Reflector': 'B', 'Rotors': 'I II III', 'Rings': '01 01 01', 'Positions': 'A A A',
+                   'Plugboard': ''}).enigma_encode('AAAAA') == 'BDZGO'
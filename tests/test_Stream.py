@@ -0,0 +1,49 @@
+import io
+import random
+import pytest
+from enigma.Enigma import Enigma
+
+SETTINGS = {'Reflector': 'B', 'Rotors': 'Beta I III', 'Rings': '23 02 10', 'Positions': 'I M G',
+            'Plugboard': 'VH PT ZG BJ EY FS'}
+
+
+def message(length, seed=0):
+    generator = random.Random(seed)
+    return ''.join(generator.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ .\n') for _ in range(length))
+
+
+def chunks(text, seed=0):
+    generator = random.Random(seed)
+    start = 0
+    while start < len(text):
+        size = generator.choice([0, 1, 7, 300, 5000, 40000])
+        yield text[start:start + size]
+        start += size
+
+
+def encode_in_chunks(machine, text):
+    stream = machine.stream()
+    return ''.join(stream.encode(chunk) for chunk in chunks(text, seed=1))
+
+
+@pytest.mark.parametrize('length', [0, 1, 1000, 60000])
+def test_stream_matches_whole_message(length):
+    text = message(length, seed=length)
+    expected = Enigma(SETTINGS).enigma_encode(text)
+    machine = Enigma(SETTINGS)
+    assert encode_in_chunks(machine, text) == expected
+    stream = machine.stream()
+    assert b''.join(stream.encode_iter(chunk.encode() for chunk in chunks(text))).decode() == expected
+    outfile = io.BytesIO()
+    assert machine.stream().encode_file(io.BytesIO(text.encode()), outfile, chunksize=4096) == length
+    assert outfile.getvalue().decode() == expected
+
+
+def test_stream_resumes_from_saved_positions():
+    text = message(3000)
+    machine = Enigma(SETTINGS)
+    stream = machine.stream()
+    first = stream.encode(text[:1234])
+    resumed = machine.stream(stream.positions)
+    assert first + resumed.encode(text[1234:]) == Enigma(SETTINGS).enigma_encode(text)
+    assert machine.positions == Enigma(SETTINGS).positions #the machine itself does not move